@@ -0,0 +1,4 @@
+# Loads the Celery app whenever Django starts, so shared tasks use it
+from .celery import celery as celery_app
+
+__all__ = ("celery_app",)
@@ -13,4 +13,15 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.django.local')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, since it loads the models
+from pdfmaker.user.events import PDF_EVENTS_PATH, pdf_events_application  # noqa: E402
+
+
+async def application(scope, receive, send):
+    # The PDF events stream holds its connection open, which Django 4.0
+    # views cannot do asynchronously, so it is served as a plain ASGI app
+    if scope["type"] == "http" and scope["path"] == PDF_EVENTS_PATH:
+        return await pdf_events_application(scope, receive, send)
+    return await django_application(scope, receive, send)
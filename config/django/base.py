@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'pdfmaker.api.metrics.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -168,11 +169,23 @@ from config.settings.jwt import *  # noqa
 from config.settings.sessions import *  # noqa
 from config.settings.celery import *  # noqa
 from config.settings.swagger import *  # noqa
+from config.settings.pdf import *  # noqa
+from config.settings.files_and_storages import *  # noqa
+from config.settings.metrics import *  # noqa
+from config.settings.profiles import *  # noqa
+from config.settings.cache import *  # noqa
 
 # from config.settings.sentry import *  # noqa
 # from config.settings.email_sending import *  # noqa
 
 
-WKHTMLTOPDF_CMD = '/usr/bin/wkhtmltopdf'
 CELERY_TRACK_STARTED = True
 REDIS_URL = 'redis://localhost:6379'
+# Serve the shared Redis client from an in-process fakeredis server instead
+# of REDIS_URL, for local runs and the benchmarks (fakeredis is in requirements/local.txt).
+REDIS_FAKE = env.bool('REDIS_FAKE', default=False)
+# Size of the Redis connection pool of each process, see pdfmaker.common.redis_client.
+# Match it to the threads of a gunicorn worker or the concurrency of a Celery worker.
+REDIS_MAX_CONNECTIONS = env.int('REDIS_MAX_CONNECTIONS', default=10)
+# Seconds to wait for a free pooled connection before giving up.
+REDIS_POOL_TIMEOUT = env.int('REDIS_POOL_TIMEOUT', default=5)
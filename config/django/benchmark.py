@@ -0,0 +1,29 @@
+import os
+import tempfile
+
+from config.env import env
+from config.settings.files_and_storages import FileStorage
+
+from .test import *  # noqa
+
+# Self-contained settings for the pdf_benchmark command: SQLite, an in-memory
+# cache, an in-process fakeredis server and tasks run inline, so the numbers
+# only reflect the render path and do not depend on any running service.
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": env("BENCHMARK_DB", default=os.path.join(tempfile.gettempdir(), "pdfmaker-benchmark.sqlite3")),
+        # Concurrent renders write to the same file
+        "OPTIONS": {"timeout": 30},
+    }
+}
+
+# The rendered PDFs are written here, away from the real media
+MEDIA_ROOT = env("BENCHMARK_MEDIA_ROOT", default=os.path.join(tempfile.gettempdir(), "pdfmaker-benchmark-media"))
+FILE_STORAGE = FileStorage.LOCAL
+DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+PDF_FILE_STORAGE = DEFAULT_FILE_STORAGE
+PDF_FILE_STORAGE_OPTIONS = {}
+
+REDIS_FAKE = True
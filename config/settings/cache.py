@@ -0,0 +1,29 @@
+from config.env import env
+
+# Keys starting with one of these are also kept in memory by every process,
+# in front of CACHES['default'], see pdfmaker.common.tiered_cache. Writes are
+# broadcast over Redis pub/sub so the other processes drop their copy.
+TIERED_CACHE_NAMESPACES = env.list(
+    'TIERED_CACHE_NAMESPACES',
+    default=['profile_version:', 'profile_response:', 'user_active:', 'pdf_manifest_', 'pdf_artifact_'],
+)
+
+# Entries kept in memory per process, the least recently used go first.
+TIERED_CACHE_MAX_ENTRIES = env.int('TIERED_CACHE_MAX_ENTRIES', default=10000)
+
+# Seconds an entry is kept in memory at most, which also bounds how long a
+# process may serve it after a lost invalidation message.
+TIERED_CACHE_TTL = env.int('TIERED_CACHE_TTL', default=30)
+
+# Stampede protection, see TieredCache.get_or_compute: seconds the lock of
+# the caller computing a value is held at most, and how long the others
+# wait for its result before computing the value themselves.
+CACHE_STAMPEDE_LOCK_TTL = env.int('CACHE_STAMPEDE_LOCK_TTL', default=10)
+CACHE_STAMPEDE_LOCK_WAIT = env.float('CACHE_STAMPEDE_LOCK_WAIT', default=2)
+
+# Seconds an expired value is still served while a single caller refreshes it.
+CACHE_STALE_TTL = env.int('CACHE_STALE_TTL', default=60)
+
+# Eagerness of the early refresh of values about to expire, 1 is the usual
+# tradeoff, above 1 refreshes earlier and 0 turns it off.
+CACHE_XFETCH_BETA = env.float('CACHE_XFETCH_BETA', default=1.0)
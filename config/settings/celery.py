@@ -1,4 +1,7 @@
+from kombu import Queue
+
 from config.env import env
+from config.settings.profiles import PROFILE_COUNTER_FLUSH_TIME_LIMIT
 
 # https://docs.celeryproject.org/en/stable/userguide/configuration.html
 
@@ -12,10 +15,51 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 
+# Work is split into lanes, each consumed by its own workers, so a bulk run
+# or the housekeeping jobs never delay the PDF a user is waiting for:
+#   celery -A config.celery worker -Q pdf_interactive -c 4
+#   celery -A config.celery worker -Q pdf_bulk -c 2
+#   celery -A config.celery worker -Q housekeeping -c 1
+CELERY_TASK_QUEUES = (
+    Queue('pdf_interactive', routing_key='pdf_interactive', queue_arguments={'x-max-priority': 10}),
+    Queue('pdf_bulk', routing_key='pdf_bulk', queue_arguments={'x-max-priority': 10}),
+    Queue('housekeeping', routing_key='housekeeping'),
+)
+CELERY_TASK_DEFAULT_QUEUE = 'housekeeping'
+CELERY_TASK_ROUTES = {
+    'pdfmaker.user.services.generate_user_pdf': {'queue': 'pdf_interactive'},
+    'pdfmaker.user.services.normalize_user_signature': {'queue': 'pdf_interactive'},
+    'pdfmaker.user.services.generate_users_pdf_bulk': {'queue': 'pdf_bulk'},
+}
+# Priorities only hold when a worker does not reserve messages ahead of time
+CELERY_TASK_QUEUE_MAX_PRIORITY = 10
+CELERY_TASK_DEFAULT_PRIORITY = 5
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Tasks going through many users at once get more time than the default
+CELERY_TASK_ANNOTATIONS = {
+    # A bulk run renders whole chunks of users in one task
+    'pdfmaker.user.services.generate_users_pdf_bulk': {'soft_time_limit': 60 * 60, 'time_limit': 60 * 60 + 60},
+    # A counter flush goes through every dirty profile
+    'pdfmaker.user.tasks.flush_profile_counter_increments': {
+        'soft_time_limit': PROFILE_COUNTER_FLUSH_TIME_LIMIT - 60,
+        'time_limit': PROFILE_COUNTER_FLUSH_TIME_LIMIT,
+    },
+}
+
 CELERY_BEAT_SCHEDULE = {
     'notify_customers': {
         'task': 'config.tasks.notify_customers',
         'schedule': 500,
         'args': ['Hello World'],
-    }
+    },
+    # Enforces the PDF storage quotas, see config/settings/pdf.py
+    'evict_pdf_artifacts': {
+        'task': 'pdfmaker.user.tasks.evict_pdf_artifacts',
+        'schedule': env.int('PDF_EVICTION_INTERVAL', default=15 * 60),
+    },
+    # Writes the profile counter increments behind, see pdfmaker.user.counters
+    'flush_profile_counter_increments': {
+        'task': 'pdfmaker.user.tasks.flush_profile_counter_increments',
+        'schedule': env.int('PROFILE_COUNTER_FLUSH_INTERVAL', default=60),
+    },
 }
@@ -0,0 +1,44 @@
+from enum import Enum
+
+from config.env import env, env_to_enum
+
+
+class FileStorage(Enum):
+    LOCAL = "local"
+    S3 = "s3"
+
+
+# Where uploaded signatures and generated PDFs are stored. With "s3" web and
+# render workers no longer need to share a volume, they only share a bucket.
+FILE_STORAGE = env_to_enum(FileStorage, env("FILE_STORAGE", default="local"))
+
+if FILE_STORAGE == FileStorage.LOCAL:
+    DEFAULT_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+    PDF_FILE_STORAGE = "django.core.files.storage.FileSystemStorage"
+    PDF_FILE_STORAGE_OPTIONS = {}
+
+if FILE_STORAGE == FileStorage.S3:
+    DEFAULT_FILE_STORAGE = "pdfmaker.common.storages.S3Storage"
+    # PDFs are keyed by the digest of their inputs, so publishing one again
+    # must replace the object instead of picking a free name next to it.
+    PDF_FILE_STORAGE = "pdfmaker.common.storages.S3Storage"
+    PDF_FILE_STORAGE_OPTIONS = {"file_overwrite": True}
+
+    AWS_S3_ACCESS_KEY_ID = env("AWS_S3_ACCESS_KEY_ID")
+    AWS_S3_SECRET_ACCESS_KEY = env("AWS_S3_SECRET_ACCESS_KEY")
+    AWS_STORAGE_BUCKET_NAME = env("AWS_STORAGE_BUCKET_NAME")
+    AWS_S3_REGION_NAME = env("AWS_S3_REGION_NAME", default=None)
+    # Points the client at an S3-compatible server such as MinIO or moto.
+    AWS_S3_ENDPOINT_URL = env("AWS_S3_ENDPOINT_URL", default=None)
+    AWS_S3_SIGNATURE_VERSION = env("AWS_S3_SIGNATURE_VERSION", default="s3v4")
+
+    # Uploads with the same name (e.g. two "sign.png") must not overwrite each other.
+    AWS_S3_FILE_OVERWRITE = False
+    AWS_DEFAULT_ACL = "private"
+    AWS_PRESIGNED_EXPIRY = env.int("AWS_PRESIGNED_EXPIRY", default=60)  # seconds
+    AWS_QUERYSTRING_EXPIRE = AWS_PRESIGNED_EXPIRY
+
+    # Objects above the threshold are uploaded in parts of the chunk size,
+    # streamed from the file instead of sent in a single PUT.
+    AWS_S3_MULTIPART_THRESHOLD = env.int("AWS_S3_MULTIPART_THRESHOLD", default=8 * 1024 * 1024)
+    AWS_S3_MULTIPART_CHUNKSIZE = env.int("AWS_S3_MULTIPART_CHUNKSIZE", default=8 * 1024 * 1024)
@@ -0,0 +1,9 @@
+from config.env import env
+
+# Bearer token required to read /metrics/, which is disabled when it is empty.
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
+# Port the Celery workers serve their Prometheus metrics on, 0 disables the
+# exporter. Prefork workers also need PROMETHEUS_MULTIPROC_DIR, see
+# pdfmaker.common.metrics.
+CELERY_METRICS_PORT = env.int('CELERY_METRICS_PORT', default=0)
@@ -0,0 +1,126 @@
+from config.env import env
+
+# Bump this whenever the layout of the generated user PDF changes, so that
+# every cached artifact is considered stale and gets rendered again.
+PDF_TEMPLATE_VERSION = env.int('PDF_TEMPLATE_VERSION', default=1)
+
+# Extra TrueType fonts registered once per worker process by the PDF renderer,
+# as a mapping of font name to the path of its .ttf file.
+PDF_RENDERER_FONTS = {}
+PDF_RENDERER_BOLD_FONT = 'Helvetica-Bold'
+
+# Output profiles of the generated PDFs, trading fidelity for size:
+# - image_max_size/image_quality: the signature is downscaled to fit the box
+#   and re-encoded as a JPEG of that quality, None embeds it as it is stored
+# - grayscale: drops the colours of the signature
+# - page_compression: deflates the page content streams
+# - optimize: rewrites the document with PyMuPDF, dropping unused objects and
+#   packing the others into compressed object streams
+# - linearize: reorders the document for fast first-page display while it
+#   downloads, using qpdf (QPDF_CMD)
+PDF_OUTPUT_PROFILES = {
+    'archive': {
+        'image_max_size': None,
+        'image_quality': None,
+        'grayscale': False,
+        'page_compression': True,
+        'optimize': False,
+        'linearize': False,
+    },
+    'web-fast': {
+        'image_max_size': (400, 400),
+        'image_quality': 75,
+        'grayscale': False,
+        'page_compression': True,
+        'optimize': True,
+        'linearize': True,
+    },
+    'minimal': {
+        'image_max_size': (200, 200),
+        'image_quality': 50,
+        'grayscale': True,
+        'page_compression': True,
+        'optimize': True,
+        'linearize': False,
+    },
+}
+# The profile every PDF is rendered with. It is part of the inputs digest,
+# so switching it renders the PDFs again on their next request.
+PDF_OUTPUT_PROFILE = env('PDF_OUTPUT_PROFILE', default='archive')
+QPDF_CMD = env('QPDF_CMD', default='/usr/bin/qpdf')
+
+# Layouts the user PDF can be rendered with, picked per request through the
+# "template" parameter of user/start_pdf_task/ and PDF_DEFAULT_TEMPLATE
+# otherwise. Each layout names its render engine:
+# - reportlab: the built-in layout, drawn in Python
+# - html: renders the given Django template (from pdfmaker/templates) and
+#   converts it with wkhtmltopdf (WKHTMLTOPDF_CMD), so the layout can change
+#   without code changes
+PDF_TEMPLATES = {
+    'profile': {'engine': 'reportlab'},
+    'profile-html': {'engine': 'html', 'template': 'user_pdf_template.html'},
+}
+PDF_DEFAULT_TEMPLATE = env('PDF_DEFAULT_TEMPLATE', default='profile')
+WKHTMLTOPDF_CMD = env('WKHTMLTOPDF_CMD', default='/usr/bin/wkhtmltopdf')
+# A wkhtmltopdf conversion running longer than this many seconds is killed.
+PDF_HTML_RENDER_TIMEOUT = env.int('PDF_HTML_RENDER_TIMEOUT', default=30)
+
+# Uploaded signatures are normalised into a JPEG that fits in this box (in
+# pixels), which is what gets embedded in the PDFs.
+SIGNATURE_RENDER_SIZE = (400, 400)
+SIGNATURE_RENDER_QUALITY = env.int('SIGNATURE_RENDER_QUALITY', default=80)
+
+# Offload file downloads to the front web server instead of streaming them
+# from a Python worker: None, "nginx" (X-Accel-Redirect) or "apache" (X-Sendfile).
+SENDFILE_BACKEND = env('SENDFILE_BACKEND', default=None)
+# Internal nginx location mapped onto MEDIA_ROOT, used with X-Accel-Redirect.
+SENDFILE_NGINX_PREFIX = env('SENDFILE_NGINX_PREFIX', default='/protected-media/')
+
+# How long a user's in-flight render holds the lease that makes concurrent
+# PDF requests attach to it, in seconds. Keep it above the task time limit.
+PDF_RENDER_LEASE_TTL = env.int('PDF_RENDER_LEASE_TTL', default=60)
+
+# How long a stored PDF that was found is remembered, in seconds. Deleting
+# the PDF forgets it right away.
+PDF_ARTIFACT_CACHE_TTL = env.int('PDF_ARTIFACT_CACHE_TTL', default=5 * 60)
+
+# How long a PDF that was not found is remembered, in seconds, so the
+# requests waiting for the same lookup share its result. Storing the PDF
+# forgets it right away.
+PDF_ARTIFACT_MISS_CACHE_TTL = env.int('PDF_ARTIFACT_MISS_CACHE_TTL', default=5)
+
+# Priorities (0-9, higher first) of the renders on the pdf_interactive queue:
+# a user's first request goes ahead of the retries of failed renders.
+PDF_RENDER_PRIORITY = env.int('PDF_RENDER_PRIORITY', default=8)
+PDF_RETRY_PRIORITY = env.int('PDF_RETRY_PRIORITY', default=3)
+
+# Failed renders are retried with exponential backoff and full jitter: the
+# n-th retry waits a random time up to min(BACKOFF_MAX, BACKOFF_BASE * 2 ** n).
+PDF_RETRY_BACKOFF_BASE = env.int('PDF_RETRY_BACKOFF_BASE', default=2)
+PDF_RETRY_BACKOFF_MAX = env.int('PDF_RETRY_BACKOFF_MAX', default=300)
+# After this many consecutive failures the renders of a user are refused for
+# PDF_BREAKER_COOLDOWN seconds, until a new signature is uploaded.
+PDF_RETRY_MAX_ATTEMPTS = env.int('PDF_RETRY_MAX_ATTEMPTS', default=5)
+PDF_BREAKER_COOLDOWN = env.int('PDF_BREAKER_COOLDOWN', default=60 * 60)
+
+# A client waiting on user/pdf/events/ is sent a "timeout" event after this
+# many seconds and reconnects; a keep-alive comment goes out every HEARTBEAT.
+PDF_EVENTS_TIMEOUT = env.int('PDF_EVENTS_TIMEOUT', default=55)
+PDF_EVENTS_HEARTBEAT = env.int('PDF_EVENTS_HEARTBEAT', default=15)
+
+# Generated PDFs are evicted, least recently downloaded first, once they take
+# more than PDF_STORAGE_QUOTA_BYTES or PDF_STORAGE_QUOTA_FILES (0 disables a
+# quota). Eviction goes down to PDF_EVICTION_TARGET_RATIO of the quota, so it
+# does not run again right after the next render.
+PDF_STORAGE_QUOTA_BYTES = env.int('PDF_STORAGE_QUOTA_BYTES', default=0)
+PDF_STORAGE_QUOTA_FILES = env.int('PDF_STORAGE_QUOTA_FILES', default=0)
+PDF_EVICTION_TARGET_RATIO = env.float('PDF_EVICTION_TARGET_RATIO', default=0.9)
+# PDFs accessed within this many seconds are never evicted.
+PDF_EVICTION_MIN_AGE = env.int('PDF_EVICTION_MIN_AGE', default=60 * 60)
+PDF_EVICTION_BATCH_SIZE = env.int('PDF_EVICTION_BATCH_SIZE', default=500)
+
+# PDFs not downloaded for this many seconds are evicted whatever the quotas.
+# Their manifests (see pdfmaker.user.artifacts) expire a day later, so a
+# stored PDF always has one; every download extends both.
+PDF_ARTIFACT_MAX_IDLE = env.int('PDF_ARTIFACT_MAX_IDLE', default=30 * 24 * 60 * 60)
+PDF_MANIFEST_TTL = PDF_ARTIFACT_MAX_IDLE + 24 * 60 * 60
@@ -0,0 +1,14 @@
+from config.env import env
+
+# Pending profile counter increments are written back to the database in
+# batches of this many profiles, one UPDATE per batch, and the old counter
+# snapshots are drained this many keys at a time, see pdfmaker.user.counters.
+PROFILE_COUNT_BATCH_SIZE = env.int('PROFILE_COUNT_BATCH_SIZE', default=1000)
+
+# Seconds a counter flush may run before Celery kills it. Increments claimed
+# by a flush that did not finish within it are given back by the next one.
+PROFILE_COUNTER_FLUSH_TIME_LIMIT = env.int('PROFILE_COUNTER_FLUSH_TIME_LIMIT', default=10 * 60)
+
+# How long a built profile response is cached, in seconds. Changes to the
+# profile invalidate it earlier, see pdfmaker.user.profile_cache.
+PROFILE_CACHE_TTL = env.int('PROFILE_CACHE_TTL', default=15 * 60)
@@ -3,5 +3,10 @@
 echo "--> Waiting for db to be ready"
 ./wait-for-it.sh db:5432
 
-echo "--> Starting celery process"
-celery -A pdfmaker.tasks worker -l info --without-gossip --without-mingle --without-heartbeat
+# Samples of a previous run would be exported again, see pdfmaker.common.metrics
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
+echo "--> Starting celery process for ${CELERY_QUEUES:=pdf_interactive,pdf_bulk,housekeeping}"
+celery -A config.celery worker -Q "$CELERY_QUEUES" -c "${CELERY_CONCURRENCY:-2}" -n "${CELERY_WORKER_NAME:-worker}@%h" -l info --without-gossip --without-mingle --without-heartbeat
@@ -10,6 +10,11 @@ python manage.py migrate
 python manage.py collectstatic --clear --noinput
 python manage.py collectstatic --noinput
 
+# Samples of a previous run would be exported again, see pdfmaker.common.metrics
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]; then
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR" && mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 # Start server
 echo "--> Starting web process"
 gunicorn config.wsgi:application -b 0.0.0.0:8000
\ No newline at end of file
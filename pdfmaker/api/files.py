@@ -0,0 +1,133 @@
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def parse_range_header(header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parses a single ``bytes=`` range against a file of the given size.
+
+    Returns:
+        tuple[int, int] | None: The inclusive first and last byte offsets,
+            or None when the range is malformed or unsatisfiable. Multiple
+            ranges are not supported and also yield None.
+    """
+    match = RANGE_RE.match(header.strip())
+    if match is None:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range, e.g. "bytes=-500" is the last 500 bytes
+        length = int(last)
+        if length == 0:
+            return None
+        return max(size - length, 0), size - 1
+    first = int(first)
+    last = int(last) if last else size - 1
+    if first >= size or last < first:
+        return None
+    return first, min(last, size - 1)
+
+
+def _iter_file_range(path: str, first: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(first)
+        while length > 0:
+            data = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _if_range_matches(request, etag: str, last_modified: int) -> bool:
+    if_range = request.META.get("HTTP_IF_RANGE")
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    return parse_http_date_safe(if_range) == last_modified
+
+
+def _sendfile_response(path: str, content_type: str) -> HttpResponse | None:
+    backend = settings.SENDFILE_BACKEND
+    if backend == "nginx":
+        response = HttpResponse(content_type=content_type)
+        relative_path = os.path.relpath(path, settings.MEDIA_ROOT)
+        response["X-Accel-Redirect"] = settings.SENDFILE_NGINX_PREFIX + relative_path
+        return response
+    if backend == "apache":
+        response = HttpResponse(content_type=content_type)
+        response["X-Sendfile"] = path
+        return response
+    return None
+
+
+def _file_response(request, path: str, content_type: str, size: int, etag: str, last_modified: int):
+    byte_range = None
+    range_header = request.META.get("HTTP_RANGE")
+    if range_header and _if_range_matches(request, etag, last_modified):
+        byte_range = parse_range_header(range_header, size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        first, last = byte_range
+        length = last - first + 1
+        response = StreamingHttpResponse(_iter_file_range(path, first, length), status=206, content_type=content_type)
+        response["Content-Length"] = str(length)
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    return response
+
+
+def serve_file(request, *, path: str, content_type: str, filename: str, version: str):
+    """
+    Serves a file with conditional GET, byte range and sendfile support.
+
+    ``If-None-Match``/``If-Modified-Since`` are answered with a 304 without
+    touching the file content. When ``SENDFILE_BACKEND`` is set, the bytes
+    are pushed by the front web server (which also handles ``Range``), so
+    the Python worker only returns headers. Otherwise a single ``Range`` is
+    served as a 206 partial response.
+
+    Args:
+        request: The incoming request.
+        path (str): The absolute path of the file.
+        content_type (str): The content type of the file.
+        filename (str): The file name suggested to the client.
+        version (str): Identifies the content of the file, e.g. a digest. The
+            entity tag combines it with the modification time of the file.
+
+    Returns:
+        HttpResponse: The response to send back.
+    """
+    stat = os.stat(path)
+    etag = quote_etag(f"{version}-{stat.st_mtime_ns:x}")
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = _sendfile_response(path, content_type)
+        if response is None:
+            response = _file_response(request, path, content_type, stat.st_size, etag, last_modified)
+        if response.status_code != 416:
+            response["Content-Disposition"] = f'inline; filename="{filename}"'
+
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    return response
@@ -0,0 +1,65 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from pdfmaker.common.metrics import (
+    HTTP_REQUEST_DB_QUERIES,
+    HTTP_REQUEST_DB_SECONDS,
+    HTTP_REQUEST_SECONDS,
+    metrics_registry,
+)
+
+
+class MetricsMiddleware:
+    """
+    Records the time spent on every request, and the number and duration
+    of the database queries it made, labelled with the name of its view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = {"count": 0, "seconds": 0.0}
+
+        def time_query(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                queries["count"] += 1
+                queries["seconds"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(time_query))
+            response = self.get_response(request)
+        seconds = time.perf_counter() - started
+
+        # Labelled by route name rather than path, so IDs in URLs do not
+        # blow up the number of series
+        match = request.resolver_match
+        view = match.view_name if match is not None else "unresolved"
+        HTTP_REQUEST_SECONDS.labels(view=view, method=request.method, status=response.status_code).observe(seconds)
+        HTTP_REQUEST_DB_QUERIES.labels(view=view).observe(queries["count"])
+        HTTP_REQUEST_DB_SECONDS.labels(view=view).observe(queries["seconds"])
+        return response
+
+
+def metrics_view(request):
+    """
+    Serves the metrics of the web processes in the Prometheus text format,
+    to scrapers sending ``METRICS_TOKEN`` as a bearer token. Without a
+    token configured the endpoint does not exist.
+    """
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+        return HttpResponse(status=403)
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
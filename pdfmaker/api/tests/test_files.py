@@ -0,0 +1,106 @@
+import os
+import tempfile
+
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+from pdfmaker.api.files import parse_range_header, serve_file
+
+CONTENT = bytes(range(256)) * 4
+
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_ranges(self):
+        cases = {
+            "bytes=0-99": (0, 99),
+            "bytes=100-": (100, 1023),
+            "bytes=-100": (924, 1023),
+            "bytes=-5000": (0, 1023),
+            "bytes=1000-5000": (1000, 1023),
+            " bytes=5-5 ": (5, 5),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range_header(header, 1024), expected)
+
+    def test_unsatisfiable_or_malformed_ranges(self):
+        for header in ("bytes=1024-", "bytes=10-5", "bytes=-0", "bytes=-", "bytes=0-1,5-9", "items=0-9", "bytes=a-b"):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1024))
+
+
+@override_settings(SENDFILE_BACKEND=None)
+class ServeFileTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "user_1.pdf")
+        with open(self.path, "wb") as f:
+            f.write(CONTENT)
+        self.factory = RequestFactory()
+
+    def serve(self, **headers):
+        request = self.factory.get("/user/pdf/", **headers)
+        response = serve_file(
+            request, path=self.path, content_type="application/pdf", filename="user_1.pdf", version="digest",
+        )
+        self.addCleanup(response.close)
+        return response
+
+    def test_whole_file(self):
+        response = self.serve()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Disposition"], 'inline; filename="user_1.pdf"')
+        self.assertTrue(response["ETag"].startswith('"digest-'))
+
+    def test_range(self):
+        response = self.serve(HTTP_RANGE="bytes=10-19")
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT[10:20])
+        self.assertEqual(response["Content-Length"], "10")
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(CONTENT)}")
+
+    def test_unsatisfiable_range(self):
+        response = self.serve(HTTP_RANGE=f"bytes={len(CONTENT)}-")
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(CONTENT)}")
+
+    def test_range_is_ignored_when_if_range_does_not_match(self):
+        etag = self.serve()["ETag"]
+
+        self.assertEqual(self.serve(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE=etag).status_code, 206)
+        response = self.serve(HTTP_RANGE="bytes=0-9", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), CONTENT)
+
+    def test_conditional_get(self):
+        response = self.serve()
+
+        not_modified = self.serve(HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified["ETag"], response["ETag"])
+        self.assertEqual(self.serve(HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]).status_code, 304)
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_etag_changes_with_the_file(self):
+        etag = self.serve()["ETag"]
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+        self.assertNotEqual(self.serve()["ETag"], etag)
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(SENDFILE_BACKEND="nginx", SENDFILE_NGINX_PREFIX="/protected-media/")
+    def test_nginx_sendfile(self):
+        with override_settings(MEDIA_ROOT=os.path.dirname(self.path)):
+            response = self.serve()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/user_1.pdf")
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["Last-Modified"], http_date(int(os.stat(self.path).st_mtime)))
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CommonConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pdfmaker.common'
+
+    def ready(self):
+        # Connects the signals measuring the queue wait of the Celery tasks,
+        # and the ones feeding the Prometheus metrics
+        from pdfmaker.common import queues, metrics  # noqa
@@ -0,0 +1,126 @@
+import logging
+import os
+import time
+
+from celery.signals import task_postrun, task_prerun, worker_process_shutdown, worker_ready
+from django.conf import settings
+from prometheus_client import REGISTRY, CollectorRegistry, Counter, Histogram, multiprocess, start_http_server
+
+from pdfmaker.common.stages import connect_stage_listener
+
+logger = logging.getLogger(__name__)
+
+# With PROMETHEUS_MULTIPROC_DIR set, every process (gunicorn workers, Celery
+# pool processes) writes its samples to that directory and the exporter
+# aggregates them. Without it each process only exports its own samples.
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+PDF_STAGE_SECONDS = Histogram(
+    "pdf_stage_seconds",
+    "Duration of the stages of the PDF pipeline, see pdfmaker.common.stages.",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REDIS_ROUND_TRIP_SECONDS = Histogram(
+    "redis_round_trip_seconds",
+    "Duration of the round trips of the shared Redis client, a pipeline counts as one.",
+    ["kind"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+REDIS_POOL_WAIT_SECONDS = Histogram(
+    "redis_pool_wait_seconds",
+    "Time spent waiting for a connection of the shared Redis pool, see REDIS_MAX_CONNECTIONS.",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "Time spent handling a request, per view.",
+    ["view", "method", "status"],
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries made while handling a request, per view.",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100),
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds",
+    "Time spent in database queries while handling a request, per view.",
+    ["view"],
+)
+CELERY_QUEUE_WAIT_SECONDS = Histogram(
+    "celery_queue_wait_seconds",
+    "Time a task waited in its queue before a worker started it, see pdfmaker.common.queues.",
+    ["queue"],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300),
+)
+CELERY_TASK_SECONDS = Histogram(
+    "celery_task_seconds",
+    "Run time of the Celery tasks.",
+    ["task", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300),
+)
+TIERED_CACHE_REQUESTS = Counter(
+    "tiered_cache_requests",
+    "Lookups of the tiered cache per tier, see pdfmaker.common.tiered_cache.",
+    ["tier", "result"],
+)
+CACHE_STAMPEDE_REQUESTS = Counter(
+    "cache_stampede_requests",
+    "Outcomes of the lookups of the stampede protected caches, see TieredCache.get_or_compute.",
+    ["cache", "result"],
+)
+
+
+def metrics_registry() -> CollectorRegistry:
+    """
+    Returns the registry to export: the samples of every process in
+    multiprocess mode, the ones of the current process otherwise.
+    """
+    if not MULTIPROCESS:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+@connect_stage_listener
+def observe_stage(name: str, seconds: float):
+    PDF_STAGE_SECONDS.labels(stage=name).observe(seconds)
+
+
+_task_started = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs):
+    _task_started[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def observe_task(task_id=None, task=None, state=None, **kwargs):
+    started = _task_started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_SECONDS.labels(task=task.name, state=state or "UNKNOWN").observe(time.perf_counter() - started)
+
+
+@worker_ready.connect
+def start_worker_exporter(**kwargs):
+    """
+    Serves the metrics of a Celery worker on ``CELERY_METRICS_PORT``.
+
+    The tasks run in the pool processes, so a prefork worker needs
+    ``PROMETHEUS_MULTIPROC_DIR`` for their samples to be exported.
+    """
+    if not settings.CELERY_METRICS_PORT:
+        return
+    if not MULTIPROCESS:
+        logger.warning('PROMETHEUS_MULTIPROC_DIR is not set, the samples of the pool processes are not exported')
+    start_http_server(settings.CELERY_METRICS_PORT, registry=metrics_registry())
+    logger.info(f'Worker metrics served on port {settings.CELERY_METRICS_PORT}')
+
+
+@worker_process_shutdown.connect
+def mark_process_dead(pid=None, **kwargs):
+    if MULTIPROCESS:
+        multiprocess.mark_process_dead(pid or os.getpid())
@@ -0,0 +1,111 @@
+import time
+from datetime import datetime
+
+from celery import current_app
+from celery.signals import before_task_publish, task_prerun
+from django.conf import settings
+
+from pdfmaker.common.metrics import CELERY_QUEUE_WAIT_SECONDS
+from pdfmaker.common.redis_client import get_redis_client, redis_script
+
+# Upper bounds (in seconds) of the buckets counting the queue wait times
+QUEUE_WAIT_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, float("inf"))
+
+# Counts a wait in its bucket and updates the totals, in a single round trip
+_record_wait = redis_script("""
+redis.call('HINCRBY', KEYS[1], 'count', 1)
+redis.call('HINCRBYFLOAT', KEYS[1], 'sum', ARGV[1])
+redis.call('HINCRBY', KEYS[1], ARGV[2], 1)
+if tonumber(ARGV[1]) > tonumber(redis.call('HGET', KEYS[1], 'max') or '0') then
+    redis.call('HSET', KEYS[1], 'max', ARGV[1])
+end
+""")
+
+
+def queue_wait_key(queue: str) -> str:
+    return f"queue_wait_{queue}"
+
+
+def _bucket(seconds: float) -> str:
+    for bound in QUEUE_WAIT_BUCKETS:
+        if seconds <= bound:
+            return f"le_{bound}"
+
+
+@before_task_publish.connect
+def stamp_enqueued_at(headers=None, **kwargs):
+    # Custom headers end up as attributes of the request in the worker
+    if headers is not None:
+        headers.setdefault("enqueued_at", time.time())
+
+
+@task_prerun.connect
+def record_queue_wait(task=None, **kwargs):
+    """
+    Records how long a task waited in its queue before a worker started it.
+
+    A task sent with a countdown only starts waiting at its ETA.
+    """
+    request = task.request
+    enqueued_at = getattr(request, "enqueued_at", None)
+    queue = (request.delivery_info or {}).get("routing_key")
+    if enqueued_at is None or queue is None:
+        return
+    ready_at = float(enqueued_at)
+    if request.eta:
+        ready_at = max(ready_at, datetime.fromisoformat(request.eta).timestamp())
+    wait = max(time.time() - ready_at, 0)
+    _record_wait(keys=[queue_wait_key(queue)], args=[wait, _bucket(wait)])
+    CELERY_QUEUE_WAIT_SECONDS.labels(queue=queue).observe(wait)
+
+
+def _quantile(buckets: dict, count: int, maximum: float, q: float) -> float:
+    # Upper bound of the bucket holding the quantile, the last one is open
+    seen = 0
+    for bound in QUEUE_WAIT_BUCKETS[:-1]:
+        seen += buckets.get(f"le_{bound}", 0)
+        if seen >= q * count:
+            return min(bound, maximum)
+    return maximum
+
+
+def _queue_depths(queues: list[str]) -> dict:
+    depths = dict.fromkeys(queues)
+    try:
+        with current_app.connection_for_read() as connection:
+            connection.ensure_connection(max_retries=1)
+            for queue in queues:
+                depths[queue] = connection.default_channel.queue_declare(queue=queue, passive=True).message_count
+    except Exception:
+        # The broker is unreachable or a queue was not declared yet
+        pass
+    return depths
+
+
+def get_queue_wait_stats() -> dict:
+    """
+    Returns, per queue, the number of messages waiting in it and how long
+    its tasks waited before a worker picked them up: the count, average and
+    maximum, and the p50/p95 as the upper bound of their bucket.
+    """
+    queue_names = [queue.name for queue in settings.CELERY_TASK_QUEUES]
+    pipe = get_redis_client().pipeline(transaction=False)
+    for name in queue_names:
+        pipe.hgetall(queue_wait_key(name))
+
+    depths = _queue_depths(queue_names)
+    stats = {}
+    for name, wait in zip(queue_names, pipe.execute()):
+        count = int(wait.pop("count", 0))
+        total = float(wait.pop("sum", 0))
+        maximum = float(wait.pop("max", 0))
+        buckets = {bucket: int(value) for bucket, value in wait.items()}
+        stats[name] = {
+            "depth": depths[name],
+            "count": count,
+            "avg_seconds": total / count if count else None,
+            "max_seconds": maximum if count else None,
+            "p50_seconds": _quantile(buckets, count, maximum, 0.5) if count else None,
+            "p95_seconds": _quantile(buckets, count, maximum, 0.95) if count else None,
+        }
+    return stats
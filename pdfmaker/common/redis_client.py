@@ -0,0 +1,121 @@
+import threading
+import time
+
+import redis
+from redis.client import Pipeline
+from django.conf import settings
+
+from pdfmaker.common.metrics import REDIS_POOL_WAIT_SECONDS, REDIS_ROUND_TRIP_SECONDS
+
+_lock = threading.Lock()
+_client = None
+_stats = {"round_trips": 0, "pool_waits": 0, "pool_wait_seconds": 0.0}
+
+
+def _record(**increments):
+    with _lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    Blocking pool that records how long callers wait for a free connection,
+    exported as ``redis_pool_wait_seconds``.
+    """
+
+    def get_connection(self, *args, **kwargs):
+        started = time.perf_counter()
+        connection = super().get_connection(*args, **kwargs)
+        waited = time.perf_counter() - started
+        _record(pool_waits=1, pool_wait_seconds=waited)
+        REDIS_POOL_WAIT_SECONDS.observe(waited)
+        return connection
+
+
+class InstrumentedPipeline(Pipeline):
+    def execute(self, *args, **kwargs):
+        _record(round_trips=1)
+        with REDIS_ROUND_TRIP_SECONDS.labels(kind="pipeline").time():
+            return super().execute(*args, **kwargs)
+
+
+class InstrumentedRedis(redis.StrictRedis):
+    """
+    Redis client counting and timing the round trips it makes; a pipeline counts as one.
+    """
+
+    def execute_command(self, *args, **options):
+        _record(round_trips=1)
+        with REDIS_ROUND_TRIP_SECONDS.labels(kind="command").time():
+            return super().execute_command(*args, **options)
+
+    def pipeline(self, transaction=True, shard_hint=None):
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def get_redis_client() -> redis.StrictRedis:
+    """
+    Returns the Redis client shared by the whole process.
+
+    All callers share one blocking connection pool of ``REDIS_MAX_CONNECTIONS``
+    connections, so requests and tasks reuse open connections instead of
+    building a new pool (and TCP connection) per call. redis-py resets the
+    pool in forked children, so every gunicorn or Celery worker process
+    ends up with its own pool.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                if settings.REDIS_FAKE:
+                    pool = _fake_pool()
+                else:
+                    pool = InstrumentedConnectionPool.from_url(
+                        settings.REDIS_URL,
+                        max_connections=settings.REDIS_MAX_CONNECTIONS,
+                        timeout=settings.REDIS_POOL_TIMEOUT,
+                        decode_responses=True,
+                    )
+                _client = InstrumentedRedis(connection_pool=pool)
+    return _client
+
+
+def _fake_pool() -> InstrumentedConnectionPool:
+    # fakeredis is a local dependency only, see requirements/local.txt
+    import fakeredis
+
+    return InstrumentedConnectionPool(
+        connection_class=fakeredis.FakeConnection,
+        server=fakeredis.FakeServer(),
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        decode_responses=True,
+    )
+
+
+def redis_client_stats() -> dict:
+    """
+    Returns the round trips made by the shared client of this process and
+    the number of (and time spent in) waits for a pooled connection.
+    """
+    with _lock:
+        return dict(_stats)
+
+
+def redis_script(source: str):
+    """
+    Returns a callable running a Lua script on the shared client.
+
+    The script is sent once and then invoked by its SHA with EVALSHA, so a
+    multi-key read-modify-write costs a single round trip and runs atomically.
+    """
+    script = None
+
+    def run(keys=(), args=()):
+        nonlocal script
+        if script is None:
+            script = get_redis_client().register_script(source)
+        return script(keys=keys, args=args)
+
+    return run
@@ -0,0 +1,42 @@
+import threading
+import time
+from contextlib import contextmanager
+
+_lock = threading.Lock()
+_listeners = []
+
+
+def connect_stage_listener(listener):
+    """
+    Registers a callable that is called with the name and the duration (in
+    seconds) of every stage timed in this process, see ``stage``. Returns
+    the listener, so it can be used as a decorator.
+    """
+    with _lock:
+        _listeners.append(listener)
+    return listener
+
+
+def disconnect_stage_listener(listener):
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a stage of a pipeline (e.g. ``"layout"`` of a PDF render) and
+    reports its duration to the registered listeners.
+
+    Nothing is measured while no listener is registered. A stage that
+    raises is not reported.
+    """
+    if not _listeners:
+        yield
+        return
+    started = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - started
+    for listener in list(_listeners):
+        listener(name, seconds)
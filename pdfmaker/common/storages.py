@@ -0,0 +1,162 @@
+import functools
+import os
+import tempfile
+
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage, get_storage_class
+from storages.backends.s3boto3 import S3Boto3Storage
+
+
+class S3Storage(S3Boto3Storage):
+    """
+    S3 storage whose uploads switch to multipart above ``AWS_S3_MULTIPART_THRESHOLD``.
+
+    Multipart uploads stream the file in ``AWS_S3_MULTIPART_CHUNKSIZE``
+    parts, so a large object is never sent (or retried) as one request.
+    """
+
+    def __init__(self, **settings_overrides):
+        super().__init__(**settings_overrides)
+        self._transfer_config = TransferConfig(
+            multipart_threshold=settings.AWS_S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.AWS_S3_MULTIPART_CHUNKSIZE,
+            use_threads=self.use_threads,
+        )
+
+
+@functools.lru_cache(maxsize=None)
+def get_pdf_storage() -> Storage:
+    """
+    Returns the storage of the generated PDFs, built once per process from
+    ``PDF_FILE_STORAGE`` and ``PDF_FILE_STORAGE_OPTIONS``.
+    """
+    return get_storage_class(settings.PDF_FILE_STORAGE)(**settings.PDF_FILE_STORAGE_OPTIONS)
+
+
+def is_local_storage(storage: Storage) -> bool:
+    """
+    Whether the files of a storage live on the local filesystem.
+    """
+    return isinstance(storage, FileSystemStorage)
+
+
+def file_size(storage: Storage, name: str) -> int | None:
+    """
+    Returns the size of a file in bytes, or None when it does not exist.
+
+    Unlike ``exists`` followed by ``size`` this costs a single request on object storages.
+    """
+    try:
+        return storage.size(name)
+    except OSError:
+        return None
+    except ClientError as error:
+        if error.response["ResponseMetadata"]["HTTPStatusCode"] == 404:
+            return None
+        raise
+
+
+def list_files(storage: Storage, prefix: str) -> list[str]:
+    """
+    Returns the names of the files of a storage starting with the given prefix.
+
+    Object storages are asked for the prefix directly instead of listing
+    the whole "directory" it lives in.
+    """
+    if isinstance(storage, S3Boto3Storage):
+        location = f"{storage.location}/" if storage.location else ""
+        objects = storage.bucket.objects.filter(Prefix=location + prefix)
+        return [obj.key[len(location):] for obj in objects]
+
+    directory, name_prefix = os.path.split(prefix)
+    if not storage.exists(directory):
+        return []
+    _, files = storage.listdir(directory)
+    return [os.path.join(directory, name) for name in files if name.startswith(name_prefix)]
+
+
+def walk_files(storage: Storage, directory: str):
+    """
+    Yields the name, size and modification timestamp of every file below a
+    directory of a storage, however deep.
+    """
+    if isinstance(storage, S3Boto3Storage):
+        location = f"{storage.location}/" if storage.location else ""
+        for obj in storage.bucket.objects.filter(Prefix=f"{location}{directory}/"):
+            yield obj.key[len(location):], obj.size, obj.last_modified.timestamp()
+        return
+
+    root = storage.path(directory)
+    for dirpath, _, files in os.walk(root):
+        for filename in files:
+            # Skips the temporary files of writes in progress
+            if filename.startswith("."):
+                continue
+            stat = os.stat(os.path.join(dirpath, filename))
+            name = os.path.relpath(os.path.join(dirpath, filename), storage.path(""))
+            yield name.replace(os.sep, "/"), stat.st_size, stat.st_mtime
+
+
+def save_file(storage: Storage, name: str, content: bytes) -> str:
+    """
+    Writes a file under exactly the given name, replacing any previous one.
+
+    Readers either see the previous file or the complete new one. On the
+    local filesystem the content goes to a temporary file in the same
+    directory which is then renamed over the final path; object storages
+    publish a PUT (or a completed multipart upload) atomically by themselves.
+
+    Args:
+        storage (Storage): The storage to write to.
+        name (str): The name of the file in the storage.
+        content (bytes): The content of the file.
+
+    Returns:
+        str: The name of the file.
+    """
+    if not is_local_storage(storage):
+        return storage.save(name, ContentFile(content))
+
+    path = storage.path(name)
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix=".", suffix=".part", delete=False) as tmp:
+        try:
+            tmp.write(content)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        except BaseException:
+            os.remove(tmp.name)
+            raise
+    try:
+        os.replace(tmp.name, path)
+    except BaseException:
+        os.remove(tmp.name)
+        raise
+    # Uploads get their permissions through the storage, keep the other files consistent with them
+    os.chmod(path, storage.file_permissions_mode or 0o644)
+    return name
+
+
+def presigned_url(storage: Storage, name: str, *, content_type: str, filename: str) -> str | None:
+    """
+    Returns a presigned URL downloading a file straight from an object
+    storage, valid for ``AWS_PRESIGNED_EXPIRY`` seconds.
+
+    Returns:
+        str | None: The URL, or None for storages that cannot presign, whose
+            files have to be served by the application instead.
+    """
+    if not isinstance(storage, S3Boto3Storage):
+        return None
+    return storage.url(
+        name,
+        parameters={
+            "ResponseContentType": content_type,
+            "ResponseContentDisposition": f'inline; filename="{filename}"',
+        },
+        expire=settings.AWS_PRESIGNED_EXPIRY,
+    )
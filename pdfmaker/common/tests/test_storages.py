@@ -0,0 +1,84 @@
+from urllib.parse import parse_qs, urlparse
+
+import boto3
+from django.test import SimpleTestCase, override_settings
+from moto import mock_s3
+
+from pdfmaker.common.storages import S3Storage, file_size, list_files, presigned_url, save_file, walk_files
+from pdfmaker.utils.tests import faker
+
+BUCKET = "pdfmaker-test"
+
+
+@mock_s3
+@override_settings(
+    AWS_S3_ACCESS_KEY_ID="testing",
+    AWS_S3_SECRET_ACCESS_KEY="testing",
+    AWS_STORAGE_BUCKET_NAME=BUCKET,
+    AWS_S3_REGION_NAME="us-east-1",
+    AWS_S3_SIGNATURE_VERSION="s3v4",
+    AWS_DEFAULT_ACL="private",
+    AWS_PRESIGNED_EXPIRY=60,
+    AWS_QUERYSTRING_EXPIRE=60,
+    AWS_S3_MULTIPART_THRESHOLD=8 * 1024 * 1024,
+    AWS_S3_MULTIPART_CHUNKSIZE=8 * 1024 * 1024,
+)
+class S3StorageTests(SimpleTestCase):
+    """
+    Runs the storage helpers against the S3 backend, with the bucket served by moto.
+    """
+
+    def setUp(self):
+        boto3.client(
+            "s3", region_name="us-east-1", aws_access_key_id="testing", aws_secret_access_key="testing"
+        ).create_bucket(Bucket=BUCKET)
+        # Configured like PDF_FILE_STORAGE, see config/settings/files_and_storages.py
+        self.storage = S3Storage(file_overwrite=True)
+
+    def test_save_file_overwrites_under_the_same_name(self):
+        name = f"pdfs/ab/cd/{faker.file_name(extension='pdf')}"
+
+        self.assertEqual(save_file(self.storage, name, b"first"), name)
+        self.assertEqual(save_file(self.storage, name, b"second version"), name)
+
+        with self.storage.open(name, "rb") as f:
+            self.assertEqual(f.read(), b"second version")
+        self.assertEqual(list_files(self.storage, "pdfs/ab/cd/"), [name])
+
+    def test_list_files_returns_only_the_prefix(self):
+        for name in ("pdfs/ab/cd/user_1_a.pdf", "pdfs/ab/cd/user_1_b.pdf", "pdfs/ab/cd/user_12_a.pdf"):
+            save_file(self.storage, name, b"%PDF")
+
+        self.assertEqual(
+            sorted(list_files(self.storage, "pdfs/ab/cd/user_1_")),
+            ["pdfs/ab/cd/user_1_a.pdf", "pdfs/ab/cd/user_1_b.pdf"],
+        )
+        self.assertEqual(list_files(self.storage, "pdfs/ef/"), [])
+
+    def test_file_size(self):
+        save_file(self.storage, "pdfs/ab/cd/user_1_a.pdf", b"12345")
+
+        self.assertEqual(file_size(self.storage, "pdfs/ab/cd/user_1_a.pdf"), 5)
+        self.assertIsNone(file_size(self.storage, "pdfs/ab/cd/missing.pdf"))
+
+    def test_walk_files_goes_through_every_level(self):
+        save_file(self.storage, "pdfs/ab/cd/user_1_a.pdf", b"123")
+        save_file(self.storage, "pdfs/ef/01/user_2_a.pdf", b"12345")
+        save_file(self.storage, "signatures/ab/cd/sign.png", b"png")
+
+        files = {name: size for name, size, modified_at in walk_files(self.storage, "pdfs")}
+
+        self.assertEqual(files, {"pdfs/ab/cd/user_1_a.pdf": 3, "pdfs/ef/01/user_2_a.pdf": 5})
+
+    def test_presigned_url(self):
+        save_file(self.storage, "pdfs/ab/cd/user_1_a.pdf", b"%PDF")
+
+        url = presigned_url(
+            self.storage, "pdfs/ab/cd/user_1_a.pdf", content_type="application/pdf", filename="user_1.pdf"
+        )
+
+        query = parse_qs(urlparse(url).query)
+        self.assertIn("pdfs/ab/cd/user_1_a.pdf", urlparse(url).path)
+        self.assertEqual(query["response-content-type"], ["application/pdf"])
+        self.assertEqual(query["response-content-disposition"], ['inline; filename="user_1.pdf"'])
+        self.assertEqual(query["X-Amz-Expires"], ["60"])
@@ -0,0 +1,184 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from pdfmaker.common.redis_client import get_redis_client
+from pdfmaker.common.tiered_cache import INVALIDATION_CHANNEL, LocalCache, TieredCache
+from pdfmaker.utils.tests import clear_caches, faker
+
+
+class LocalCacheTests(SimpleTestCase):
+    def test_least_recently_used_entries_go_first(self):
+        local = LocalCache(max_entries=2, ttl=60)
+        local.set("a", 1)
+        local.set("b", 2)
+        local.get("a")
+        local.set("c", 3)
+
+        self.assertEqual((local.get("a"), local.get("c")), (1, 3))
+        self.assertIsNot(local.get("b"), 2)
+        self.assertEqual(len(local), 2)
+
+    def test_entries_expire(self):
+        local = LocalCache(max_entries=2, ttl=0)
+        local.set("a", 1)
+
+        self.assertIsNot(local.get("a"), 1)
+
+    def test_value_read_before_a_deletion_is_refused(self):
+        local = LocalCache(max_entries=2, ttl=60)
+        epoch = local.epoch
+        local.delete("a")
+        local.set("a", "outdated", epoch=epoch)
+
+        self.assertIsNot(local.get("a"), "outdated")
+
+
+@override_settings(
+    TIERED_CACHE_NAMESPACES=["tiered:"],
+    CACHE_STAMPEDE_LOCK_WAIT=1,
+    CACHE_STAMPEDE_LOCK_TTL=10,
+    CACHE_STALE_TTL=60,
+    CACHE_XFETCH_BETA=1,
+)
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+        self.cache = TieredCache()
+        self.key = f"test:{faker.uuid4()}"
+        self.compute = mock.Mock(return_value="value")
+
+    def get_or_compute(self, **kwargs):
+        return self.cache.get_or_compute(self.key, self.compute, 60, name="test", **kwargs)
+
+    def counts(self) -> dict:
+        return self.cache.stats()["stampede"].get("test", {})
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(self.get_or_compute(), "value")
+        self.assertEqual(self.get_or_compute(), "value")
+
+        self.compute.assert_called_once()
+        self.assertEqual(self.counts(), {"miss": 1, "hit": 1})
+
+    def test_none_is_not_cached(self):
+        self.compute.return_value = None
+
+        self.assertIsNone(self.get_or_compute())
+        self.assertIsNone(self.get_or_compute())
+
+        self.assertEqual(self.compute.call_count, 2)
+        self.assertIsNone(cache.get(f"stampede_lock:{self.key}"))
+
+    def test_nothing_found_is_cached_for_the_miss_timeout(self):
+        self.compute.return_value = ""
+
+        self.assertEqual(self.get_or_compute(miss_timeout=5), "")
+        self.assertEqual(self.get_or_compute(miss_timeout=5), "")
+
+        self.compute.assert_called_once()
+        self.assertAlmostEqual(cache.get(self.key)["expires_at"], time.time() + 5, delta=1)
+
+    def test_waiters_get_the_value_of_the_caller_computing_it(self):
+        started = threading.Event()
+
+        def compute():
+            started.set()
+            time.sleep(0.2)
+            return ""
+
+        results = []
+        computing = threading.Thread(
+            target=lambda: results.append(self.cache.get_or_compute(self.key, compute, 60, name="test")),
+        )
+        computing.start()
+        started.wait()
+        self.compute.return_value = "computed again"
+
+        self.assertEqual(self.get_or_compute(), "")
+        computing.join()
+
+        self.assertEqual(results, [""])
+        self.compute.assert_not_called()
+        self.assertEqual(self.counts(), {"miss": 1, "coalesced": 1})
+
+    @override_settings(CACHE_STAMPEDE_LOCK_WAIT=0.1)
+    def test_waiter_computes_when_the_lock_is_not_released(self):
+        cache.add(f"stampede_lock:{self.key}", 1)
+
+        self.assertEqual(self.get_or_compute(), "value")
+
+        self.compute.assert_called_once()
+        # The lock belongs to someone else
+        self.assertEqual(cache.get(f"stampede_lock:{self.key}"), 1)
+
+    def test_value_of_another_version_is_served_while_it_is_refreshed(self):
+        self.get_or_compute(version=1)
+        cache.add(f"stampede_lock:{self.key}", 1)
+        self.compute.return_value = "new value"
+
+        self.assertEqual(self.get_or_compute(version=2), "value")
+        cache.delete(f"stampede_lock:{self.key}")
+        self.assertEqual(self.get_or_compute(version=2), "new value")
+        self.assertEqual(self.get_or_compute(version=2), "new value")
+
+        self.assertEqual(self.compute.call_count, 2)
+        self.assertEqual(self.counts(), {"miss": 1, "stale": 1, "refresh": 1, "hit": 1})
+
+    def test_expired_value_is_served_while_it_is_refreshed(self):
+        cache.set(self.key, {"value": "old", "version": None, "expires_at": time.time() - 1, "delta": 0})
+        cache.add(f"stampede_lock:{self.key}", 1)
+
+        self.assertEqual(self.get_or_compute(), "old")
+
+        self.compute.assert_not_called()
+        self.assertEqual(self.counts(), {"stale": 1})
+
+    @override_settings(CACHE_XFETCH_BETA=10 ** 6)
+    def test_slow_values_are_refreshed_before_they_expire(self):
+        cache.set(self.key, {"value": "old", "version": None, "expires_at": time.time() + 30, "delta": 1})
+
+        self.assertEqual(self.get_or_compute(), "value")
+
+        self.assertEqual(self.counts(), {"early_refresh": 1})
+
+
+@override_settings(TIERED_CACHE_NAMESPACES=["tiered:"])
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+        self.cache = TieredCache()
+        self.key = f"tiered:{faker.uuid4()}"
+
+    def test_reads_are_answered_from_memory(self):
+        self.cache.set(self.key, "value")
+        cache.set(self.key, "changed behind its back")
+
+        self.assertEqual(self.cache.get(self.key), "value")
+        self.assertEqual(self.cache.get(f"other:{self.key}", default="default"), "default")
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["l1_hits"], stats["l2_misses"], stats["l1_entries"]), (1, 1, 1))
+        self.assertEqual(stats["l1_hit_ratio"], 1)
+
+    def test_invalidations_from_other_processes_drop_the_key(self):
+        self.cache.set(self.key, "value")
+        cache.set(self.key, "new value")
+
+        get_redis_client().publish(INVALIDATION_CHANNEL, self.cache.invalidation_message([self.key]))
+        deadline = time.monotonic() + 2
+        while self.cache.get(self.key) == "value" and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertEqual(self.cache.get(self.key), "new value")
+
+    def test_delete_drops_both_tiers(self):
+        self.cache.set(self.key, "value")
+
+        self.cache.delete(self.key)
+
+        self.assertIsNone(self.cache.get(self.key))
+        self.assertIsNone(cache.get(self.key))
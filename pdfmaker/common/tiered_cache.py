@@ -0,0 +1,309 @@
+import json
+import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+from pdfmaker.common.metrics import CACHE_STAMPEDE_REQUESTS, TIERED_CACHE_REQUESTS
+from pdfmaker.common.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# Processes tell each other which keys changed on this channel
+INVALIDATION_CHANNEL = "cache_invalidation"
+
+_MISSING = object()
+
+
+class LocalCache:
+    """
+    Thread-safe in-process cache, bounded in entries (least recently used
+    first out) and in the age of each entry.
+
+    ``epoch`` changes with every deletion: a value read elsewhere before a
+    deletion may be outdated, and ``set`` refuses it when given that epoch.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.epoch = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, epoch: int | None = None):
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self.epoch += 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self.epoch += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    """
+    An in-process cache (L1) in front of the Redis cache (L2, ``CACHES['default']``)
+    for the keys of ``TIERED_CACHE_NAMESPACES``; other keys go straight to L2.
+
+    Every write or invalidation is published on ``INVALIDATION_CHANNEL``,
+    and each process drops the keys it is told about from its L1. L1 is
+    only used while the process is subscribed, and is cleared whenever the
+    subscription is (re)established, so a missed message can never keep a
+    stale entry alive; ``TIERED_CACHE_TTL`` bounds the delay of a late one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stats = {"l1_hits": 0, "l1_misses": 0, "l2_hits": 0, "l2_misses": 0}
+        self._stampede_stats = defaultdict(Counter)
+
+    def _start(self):
+        # Runs again in every forked child: the listener thread and the
+        # entries of the parent are not inherited
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._origin = uuid.uuid4().hex
+            self._local = LocalCache(settings.TIERED_CACHE_MAX_ENTRIES, settings.TIERED_CACHE_TTL)
+            self._subscribed = threading.Event()
+            threading.Thread(target=self._listen, name="tiered-cache-invalidation", daemon=True).start()
+        # Give the first subscription a moment, L1 is skipped until it is up
+        self._subscribed.wait(timeout=1)
+
+    def _listen(self):
+        failing = False
+        while True:
+            try:
+                pubsub = get_redis_client().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                pubsub.get_message(timeout=1)  # the subscribe confirmation
+                self._local.clear()
+                self._subscribed.set()
+                failing = False
+                for message in pubsub.listen():
+                    payload = json.loads(message["data"])
+                    if payload["origin"] != self._origin:
+                        for key in payload["keys"]:
+                            self._local.delete(key)
+            except Exception as e:
+                self._subscribed.clear()
+                self._local.clear()
+                if not failing:
+                    logger.warning(f'Tiered cache invalidations unavailable, L1 disabled: {e}')
+                    failing = True
+                time.sleep(1)
+
+    def _count(self, tier: str, hit: bool):
+        self._stats[f"{tier}_{'hits' if hit else 'misses'}"] += 1
+        TIERED_CACHE_REQUESTS.labels(tier=tier, result="hit" if hit else "miss").inc()
+
+    def _tiered(self, key: str) -> bool:
+        if not key.startswith(tuple(settings.TIERED_CACHE_NAMESPACES)):
+            return False
+        self._start()
+        return self._subscribed.is_set()
+
+    def get(self, key: str, default=None, load=None):
+        """
+        Returns the value of a key from L1, or else from L2 and keeps it in L1.
+
+        Args:
+            key (str): The key to look up.
+            default: Returned when the key is in neither tier.
+            load: Optional callable reading the value from L2 instead of
+                ``CACHES['default']``, e.g. straight from Redis; it returns
+                None when there is no value.
+        """
+        tiered = self._tiered(key)
+        if tiered:
+            value = self._local.get(key)
+            self._count("l1", value is not _MISSING)
+            if value is not _MISSING:
+                return value
+            epoch = self._local.epoch
+        value = load() if load is not None else cache.get(key)
+        self._count("l2", value is not None)
+        if value is None:
+            return default
+        if tiered:
+            # Not kept when an invalidation came in while reading it
+            self._local.set(key, value, epoch=epoch)
+        return value
+
+    def set(self, key: str, value, timeout=DEFAULT_TIMEOUT):
+        cache.set(key, value, timeout=timeout)
+        if self._tiered(key):
+            self._local.set(key, value)
+            self._publish([key])
+
+    def delete(self, key: str):
+        cache.delete(key)
+        self.invalidate([key])
+
+    def invalidate(self, keys):
+        """
+        Drops keys whose L2 value changed from the L1 of every process.
+        """
+        keys = [key for key in keys if self._tiered(key)]
+        if keys:
+            self.forget(keys)
+            self._publish(keys)
+
+    def forget(self, keys):
+        """
+        Drops keys from the L1 of this process only, for changes that are
+        published by whoever made them (see ``invalidation_message``).
+        """
+        if self._pid == os.getpid():
+            for key in keys:
+                self._local.delete(key)
+
+    def invalidation_message(self, keys) -> str:
+        """
+        Returns the message telling every process, this one included, to
+        drop the given keys, for publishing from a Lua script.
+        """
+        return json.dumps({"origin": "", "keys": list(keys)})
+
+    def _publish(self, keys):
+        get_redis_client().publish(INVALIDATION_CHANNEL, json.dumps({"origin": self._origin, "keys": keys}))
+
+    def get_or_compute(self, key: str, compute, timeout: int, *, name: str, version=None,
+                       miss_timeout: int | None = None):
+        """
+        Returns the cached value of a key, computing it when needed without
+        letting concurrent callers stampede the source behind it.
+
+        - Only the caller taking a short lock computes a missing value, the
+          others wait up to ``CACHE_STAMPEDE_LOCK_WAIT`` for its result.
+        - A value is refreshed a little before it expires, the earlier the
+          longer it took to compute (probabilistic early expiration, or
+          XFetch), so hot keys rarely expire at all.
+        - A value that expired (up to ``CACHE_STALE_TTL`` ago) or was built
+          for another ``version`` is still served while one caller refreshes it.
+
+        Args:
+            key (str): The cache key.
+            compute: Callable returning the value, None is never cached.
+            timeout (int): Seconds the value is fresh for.
+            name (str): Name of the cache in the counts, e.g. "profile".
+            version: Optional version the value must have been computed for.
+            miss_timeout (int | None): Seconds a falsy value, standing for
+                nothing found, is fresh for; ``timeout`` by default. Callers
+                waiting for a value get it too instead of computing it again.
+
+        Returns:
+            The value, possibly stale, or None when there is none.
+        """
+        entry = self.get(key)
+        if entry is not None:
+            now = time.time()
+            fresh = entry["version"] == version and now < entry["expires_at"]
+            # XFetch: -log(u) is exponentially distributed, scaled by the compute time
+            early = now - entry["delta"] * settings.CACHE_XFETCH_BETA * math.log(1 - random.random())
+            if fresh and early < entry["expires_at"]:
+                self.count(name, "hit")
+                return entry["value"]
+            if not self._acquire(key):
+                # Another caller refreshes it meanwhile
+                self.count(name, "hit" if fresh else "stale")
+                return entry["value"]
+            self.count(name, "early_refresh" if fresh else "refresh")
+            return self._compute(key, compute, timeout, version, miss_timeout)
+
+        deadline = time.monotonic() + settings.CACHE_STAMPEDE_LOCK_WAIT
+        while not self._acquire(key):
+            if time.monotonic() >= deadline:
+                self.count(name, "miss")
+                return self._compute(key, compute, timeout, version, miss_timeout, locked=False)
+            time.sleep(0.05)
+            entry = self.get(key)
+            if entry is not None and entry["version"] == version:
+                self.count(name, "coalesced")
+                return entry["value"]
+        self.count(name, "miss")
+        return self._compute(key, compute, timeout, version, miss_timeout)
+
+    def _acquire(self, key: str) -> bool:
+        return cache.add(f"stampede_lock:{key}", 1, timeout=settings.CACHE_STAMPEDE_LOCK_TTL)
+
+    def _compute(self, key: str, compute, timeout: int, version, miss_timeout: int | None, locked: bool = True):
+        try:
+            started = time.perf_counter()
+            value = compute()
+            if value is not None:
+                if not value and miss_timeout is not None:
+                    timeout = miss_timeout
+                entry = {
+                    "value": value,
+                    "version": version,
+                    "expires_at": time.time() + timeout,
+                    "delta": time.perf_counter() - started,
+                }
+                # Kept past its expiry, to be served while it is refreshed
+                self.set(key, entry, timeout=timeout + settings.CACHE_STALE_TTL)
+            return value
+        finally:
+            if locked:
+                cache.delete(f"stampede_lock:{key}")
+
+    def count(self, name: str, result: str):
+        """
+        Counts the outcome of a lookup of a stampede protected cache: hit,
+        stale, refresh, early_refresh, coalesced or miss.
+        """
+        self._stampede_stats[name][result] += 1
+        CACHE_STAMPEDE_REQUESTS.labels(cache=name, result=result).inc()
+
+    def stats(self) -> dict:
+        """
+        Returns the lookups of this process per tier and their hit ratios.
+        L2 only counts the lookups L1 could not answer. The outcomes of the
+        stampede protected caches are under ``stampede``.
+        """
+        stats = dict(self._stats)
+        for tier in ("l1", "l2"):
+            total = stats[f"{tier}_hits"] + stats[f"{tier}_misses"]
+            stats[f"{tier}_hit_ratio"] = stats[f"{tier}_hits"] / total if total else None
+        stats["l1_entries"] = len(self._local) if self._pid == os.getpid() else 0
+        stats["stampede"] = {name: dict(counts) for name, counts in self._stampede_stats.items()}
+        return stats
+
+
+tiered_cache = TieredCache()
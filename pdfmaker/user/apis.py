@@ -2,23 +2,61 @@ from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import serializers
-from config.django import base as settings
-import os
 from django.core.validators import MinLengthValidator
 from .validators import number_validator, special_char_validator, letter_validator
-from pdfmaker.user.models import BaseUser, Profile
+from pdfmaker.user.models import BaseUser, Profile, PdfJob
 from pdfmaker.api.mixins import ApiAuthMixin
-from pdfmaker.user.selectors import get_profile
-from pdfmaker.user.services import register, update_or_add_signature, generate_user_pdf, check_task_status, delete_pdf
+from pdfmaker.api.files import serve_file
+from pdfmaker.common.storages import get_pdf_storage
+from pdfmaker.common.queues import get_queue_wait_stats
+from pdfmaker.common.tiered_cache import tiered_cache
+from pdfmaker.user.selectors import (
+    get_pdf_artifact,
+    get_pdf_eviction_stats,
+    get_pdf_jobs,
+    get_pdf_lease_stats,
+    get_profile,
+)
+from pdfmaker.user.artifacts import pdf_input_digest, pdf_download_url
+from pdfmaker.user.retries import pdf_breaker_open
+from pdfmaker.user.eviction import touch_pdf
+from pdfmaker.user.counters import get_profile_counters
+from pdfmaker.user.profile_cache import (
+    etag_matches,
+    get_profile_response,
+    get_profile_version,
+    is_user_active,
+    profile_etag,
+)
+from pdfmaker.user.services import (
+    register,
+    update_or_add_signature,
+    enqueue_user_pdf,
+    generate_users_pdf_bulk,
+    check_task_status,
+)
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from drf_spectacular.utils import extend_schema
-from django.core.cache import cache
+from django.urls import reverse
+from django.http import HttpResponseRedirect
+from django.conf import settings
+from django.db import transaction
+from django.utils.decorators import method_decorator
+import os
 
 
+@method_decorator(transaction.non_atomic_requests, name="dispatch")
 class ProfileApi(ApiAuthMixin, APIView):
     """
     API view to retrieve the profile of the authenticated user.
+
+    The user is taken from the access token without loading it, and only
+    its cached active flag is checked, so a profile that did not change is
+    served without any database query.
     """
+    authentication_classes = [JWTStatelessUserAuthentication]
 
     class OutPutSerializer(serializers.ModelSerializer):
         """
@@ -31,24 +69,41 @@ class ProfileApi(ApiAuthMixin, APIView):
 
         def to_representation(self, instance):
             """
-            Customize the representation of the profile data to include cache data.
+            Customize the representation of the profile data to include the
+            counter increments that were not flushed to the database yet.
             """
             rep = super().to_representation(instance)
-            cache_profile = cache.get(f"profile_{instance.user}", {})
-            if cache_profile:
-                rep["posts_count"] = cache_profile.get("posts_count")
-                rep["subscriber_count"] = cache_profile.get("subscribers_count")
-                rep["subscription_count"] = cache_profile.get("subscriptions_count")
-
+            rep.update(get_profile_counters(instance))
             return rep
 
     @extend_schema(responses=OutPutSerializer)
     def get(self, request):
         """
         Get the profile data of the authenticated user.
+
+        The response is cached per version of the profile and carries an
+        ``ETag``; a matching ``If-None-Match`` gets a 304 straight away.
+        While a changed profile is rebuilt, concurrent requests get the
+        previous response along with its own ETag.
         """
-        query = get_profile(user=request.user)
-        return Response(self.OutPutSerializer(query, context={"request": request}).data)
+        user_id = request.user.id
+        if not is_user_active(user_id):
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        version = get_profile_version(user_id)
+        headers = {"ETag": profile_etag(user_id, version), "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("If-None-Match"), headers["ETag"]):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        def build():
+            profile = get_profile(user_id)
+            return self.OutPutSerializer(profile, context={"request": request}).data
+
+        try:
+            cached = get_profile_response(user_id, version, build)
+        except Profile.DoesNotExist:
+            return Response({'message': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        headers["ETag"] = profile_etag(user_id, cached["version"])
+        return Response(cached["data"], headers=headers)
 
 
 class RegisterApi(APIView):
@@ -179,8 +234,6 @@ class AddSignature(APIView):
         signature = serializer.validated_data.get("signFile")
         update_or_add_signature(signature, user)
 
-        delete_pdf(user)
-
         return Response({'message': 'Signature updated successfully'})
 
 
@@ -194,22 +247,223 @@ class StartPdfTaskView(APIView):
         Serializer for validating the user ID for the PDF task.
         """
         task_id = serializers.CharField(max_length=200, default=None)
+        template = serializers.ChoiceField(choices=list(settings.PDF_TEMPLATES), required=False)
 
     def post(self, request, *args, **kwargs):
         """
         Start a background task to generate a PDF for the specified user.
+
+        When a PDF was already rendered for the user's current inputs it is
+        returned straight away, without going through Celery. The layout is
+        picked with ``template``, see ``PDF_TEMPLATES``.
         """
         serializer = self.InputSerializer(data=request.data)
         if serializer.is_valid():
             user_id = request.user.id
-            pdf_dir = os.path.join(settings.MEDIA_ROOT, "pdfs")
-            pdf_path = os.path.join(pdf_dir, f'user_{user_id}.pdf')
-            if not os.path.exists(pdf_path):
-                task = generate_user_pdf.delay(user_id)
-                return Response({'task_id': task.id}, status=status.HTTP_200_OK)
-            elif serializer.validated_data['task_id'] != "None":
-                task_id = serializer.validated_data['task_id']
+            task_id = serializer.validated_data['task_id']
+            template = serializer.validated_data.get('template')
+            pdf_name = get_pdf_artifact(user=request.user, template=template)
+            if pdf_name is None:
+                if pdf_breaker_open(user_id):
+                    return Response("something went wrong update your signature or wait for 60 minutes")
+                task_id = enqueue_user_pdf(request.user, template=template)
+                return Response({'task_id': task_id}, status=status.HTTP_200_OK)
+            elif task_id and task_id != "None":
                 result_task = check_task_status(task_id, user_id)
                 return Response(result_task)
+            touch_pdf(pdf_name)
+            download_url = reverse('user:pdf_download')
+            if template:
+                download_url = f"{download_url}?template={template}"
+            return Response({'pdf_path': pdf_name, 'download_url': download_url}, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PdfDownloadApi(ApiAuthMixin, APIView):
+    """
+    API view to download the generated PDF of the authenticated user.
+    """
+
+    class InputSerializer(serializers.Serializer):
+        """
+        Serializer for validating the template of the PDF to download.
+        """
+        template = serializers.ChoiceField(choices=list(settings.PDF_TEMPLATES), required=False)
+
+    def get(self, request):
+        """
+        Download the user's PDF, honouring conditional and range requests.
+
+        PDFs kept in an object storage are not proxied: the client is
+        redirected to a short-lived presigned URL of the object instead.
+        """
+        serializer = self.InputSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        template = serializer.validated_data.get('template')
+        pdf_name = get_pdf_artifact(user=request.user, template=template)
+        if pdf_name is None:
+            return Response(
+                {'message': 'PDF is not generated yet, start a task first'},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        touch_pdf(pdf_name)
+        filename = f"user_{request.user.id}.pdf"
+        download_url = pdf_download_url(pdf_name, filename)
+        if download_url is not None:
+            return HttpResponseRedirect(download_url)
+        return serve_file(
+            request,
+            path=get_pdf_storage().path(pdf_name),
+            content_type="application/pdf",
+            filename=filename,
+            version=pdf_input_digest(request.user, template),
+        )
+
+
+class StartBulkPdfTaskView(ApiAuthMixin, APIView):
+    """
+    API view to generate the PDFs of many users in a single Celery task.
+    """
+
+    class InputSerializer(serializers.Serializer):
+        """
+        Serializer for validating the users of a bulk PDF task.
+        """
+        user_ids = serializers.ListField(child=serializers.IntegerField(), required=False, allow_empty=False)
+        chunk_size = serializers.IntegerField(min_value=1, max_value=5000, default=500)
+        template = serializers.ChoiceField(choices=list(settings.PDF_TEMPLATES), required=False)
+
+    class StatusSerializer(serializers.Serializer):
+        """
+        Serializer for validating the ID of the bulk PDF task to track.
+        """
+        task_id = serializers.CharField(max_length=200)
+
+    def post(self, request):
+        """
+        Start a bulk PDF task for the given users, or for every user when no IDs are given.
+        """
+        if not request.user.is_admin:
+            return Response({'message': 'Only admins can start bulk PDF tasks'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task = generate_users_pdf_bulk.delay(
+            serializer.validated_data.get("user_ids"),
+            serializer.validated_data.get("chunk_size"),
+            serializer.validated_data.get("template"),
+        )
+        return Response({'task_id': task.id}, status=status.HTTP_200_OK)
+
+    def get(self, request):
+        """
+        Return the state and the per-chunk progress of a bulk PDF task.
+        """
+        if not request.user.is_admin:
+            return Response({'message': 'Only admins can track bulk PDF tasks'}, status=status.HTTP_403_FORBIDDEN)
+        serializer = self.StatusSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        result = generate_users_pdf_bulk.AsyncResult(serializer.validated_data.get("task_id"))
+        progress = result.info if isinstance(result.info, dict) else None
+        return Response({'state': result.state, 'progress': progress})
 
 
+class QueueStatsApi(ApiAuthMixin, APIView):
+    """
+    API view to monitor the Celery queues.
+    """
+
+    def get(self, request):
+        """
+        Return the depth of every queue and how long its tasks waited before they started.
+        """
+        if not request.user.is_admin:
+            return Response({'message': 'Only admins can see the queue stats'}, status=status.HTTP_403_FORBIDDEN)
+        return Response(get_queue_wait_stats())
+
+
+class PdfStatsApi(ApiAuthMixin, APIView):
+    """
+    API view to monitor the PDF storage.
+    """
+
+    def get(self, request):
+        """
+        Return the usage of the PDF storage, the hit rate of the stored PDFs,
+        how much the eviction reclaimed so far, and how many PDF requests
+        attached to an in-flight render.
+        """
+        if not request.user.is_admin:
+            return Response({'message': 'Only admins can see the PDF stats'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"eviction": get_pdf_eviction_stats(), "leases": get_pdf_lease_stats()})
+
+
+class CacheStatsApi(ApiAuthMixin, APIView):
+    """
+    API view to monitor the tiered cache, see ``pdfmaker.common.tiered_cache``.
+    """
+
+    def get(self, request):
+        """
+        Return the lookups of the process answering per cache tier, their
+        hit ratios and the outcomes of the stampede protected caches; the
+        ``tiered_cache_requests`` metric adds them up across processes.
+        """
+        if not request.user.is_admin:
+            return Response({'message': 'Only admins can see the cache stats'}, status=status.HTTP_403_FORBIDDEN)
+        return Response({"pid": os.getpid(), **tiered_cache.stats()})
+
+
+class PdfJobStatusApi(ApiAuthMixin, APIView):
+    """
+    API view to look up the status of many PDF jobs at once.
+    """
+
+    class InputSerializer(serializers.Serializer):
+        """
+        Serializer for validating the task IDs of the jobs to look up.
+        """
+        task_ids = serializers.ListField(
+            child=serializers.CharField(max_length=255),
+            allow_empty=False,
+            max_length=500,
+        )
+
+    class OutPutSerializer(serializers.ModelSerializer):
+        """
+        Serializer for outputting the status of a PDF job.
+        """
+
+        class Meta:
+            model = PdfJob
+            fields = (
+                "task_id",
+                "user",
+                "state",
+                "template",
+                "input_digest",
+                "artifact",
+                "output_sha256",
+                "attempts",
+                "created_at",
+                "started_at",
+                "finished_at",
+            )
+
+    @extend_schema(request=InputSerializer, responses=OutPutSerializer(many=True))
+    def post(self, request):
+        """
+        Return the status of the given PDF jobs, resolved with a single query.
+
+        Admins can look up the jobs of every user, other users only their own.
+        Task IDs that match no job are listed under ``missing``.
+        """
+        serializer = self.InputSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        task_ids = serializer.validated_data.get("task_ids")
+        jobs = get_pdf_jobs(task_ids=task_ids, user=None if request.user.is_admin else request.user)
+        data = self.OutPutSerializer(jobs, many=True).data
+        found = {job["task_id"] for job in data}
+        return Response({
+            'jobs': data,
+            'missing': [task_id for task_id in dict.fromkeys(task_ids) if task_id not in found],
+        })
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class UserConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'pdfmaker.user'
+
+    def ready(self):
+        # Connects the signals invalidating the cached profile responses
+        from pdfmaker.user import profile_cache  # noqa
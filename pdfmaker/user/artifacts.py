@@ -0,0 +1,208 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core import signing
+
+from pdfmaker.common.storages import get_pdf_storage, file_size, list_files, presigned_url, save_file
+from pdfmaker.common.tiered_cache import tiered_cache
+
+from .models import BaseUser
+from .layout import pdf_artifact_name, user_pdf_prefix
+
+
+def signature_content_hash(signature) -> str:
+    """
+    Computes the SHA-256 digest of an uploaded signature image.
+
+    Args:
+        signature: The uploaded file (or any Django ``File``) holding the image.
+
+    Returns:
+        str: The hex digest of the image bytes.
+    """
+    hasher = hashlib.sha256()
+    for chunk in signature.chunks():
+        hasher.update(chunk)
+    signature.seek(0)
+    return hasher.hexdigest()
+
+
+def pdf_user_fields(user: BaseUser) -> dict:
+    """
+    Returns the fields of a user the PDF templates are given, every one of
+    which is part of ``pdf_input_digest``.
+    """
+    return {"name": user.name, "email": user.email, "is_active": user.is_active, "is_admin": user.is_admin}
+
+
+def pdf_input_digest(user: BaseUser, template: str | None = None) -> str:
+    """
+    Computes the digest of every input that changes the rendered user PDF.
+
+    Two users (or the same user at two points in time) with the same digest
+    produce the same document, so the digest is used as the cache key of the
+    generated artifact.
+
+    Args:
+        user (BaseUser): The user the PDF is rendered for.
+        template (str | None): The PDF template, see ``PDF_TEMPLATES``.
+            Defaults to ``PDF_DEFAULT_TEMPLATE``.
+
+    Returns:
+        str: The hex digest of the PDF inputs.
+    """
+    template = template or settings.PDF_DEFAULT_TEMPLATE
+    payload = json.dumps(
+        {
+            "template": template,
+            "template_options": settings.PDF_TEMPLATES[template],
+            **pdf_user_fields(user),
+            "signature": user.signature_hash if user.signature else "",
+            "template_version": settings.PDF_TEMPLATE_VERSION,
+            "output_profile": settings.PDF_OUTPUT_PROFILE,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def signature_for_render(user: BaseUser):
+    """
+    Returns the signature image to embed in the user's PDF, always the
+    normalised variant of the upload, see ``services.normalize_signature``.
+    """
+    return user.signature_rendered
+
+
+def user_pdf_artifacts(user_id: int) -> list[str]:
+    """
+    Returns the storage names of every PDF artifact stored for a user.
+
+    Only the user's shard directory is listed, see ``layout``.
+    """
+    return list_files(get_pdf_storage(), f"{user_pdf_prefix(user_id)}_")
+
+
+def publish_pdf(pdf_name: str, content: bytes) -> str:
+    """
+    Atomically publishes a rendered PDF in the PDF storage.
+
+    Readers either see no file or the complete document, never a partially
+    written one, see ``save_file``.
+
+    Args:
+        pdf_name (str): The storage name of the PDF.
+        content (bytes): The rendered document.
+
+    Returns:
+        str: The storage name of the published PDF.
+    """
+    return save_file(get_pdf_storage(), pdf_name, content)
+
+
+def pdf_download_url(pdf_name: str, filename: str) -> str | None:
+    """
+    Returns a short-lived presigned URL downloading the PDF straight from
+    the object storage, or None when the PDFs are stored locally and have
+    to be served by the application.
+    """
+    return presigned_url(get_pdf_storage(), pdf_name, content_type="application/pdf", filename=filename)
+
+
+MANIFEST_SALT = "pdfmaker.user.pdf_manifest"
+
+
+def pdf_manifest_key(digest: str) -> str:
+    return f"pdf_manifest_{digest}"
+
+
+def sign_pdf_inputs(user: BaseUser, digest: str) -> str:
+    """
+    Returns the signed description of the inputs of a PDF, which is embedded
+    in the document metadata so the file can be traced back to its inputs.
+    """
+    return signing.dumps(
+        {"user_id": user.id, "input_digest": digest, "template_version": settings.PDF_TEMPLATE_VERSION},
+        salt=MANIFEST_SALT,
+    )
+
+
+def store_pdf_manifest(*, user: BaseUser, digest: str, content: bytes) -> dict:
+    """
+    Records the integrity manifest of a published PDF.
+
+    The manifest binds the inputs digest to the hash and the size of the
+    rendered bytes, and is stored signed next to the artifact, so checking a
+    PDF later never requires opening it. It expires after
+    ``PDF_MANIFEST_TTL``, extended by every access to the PDF, and is
+    deleted along with the PDF, see ``eviction.delete_stored_pdf``.
+
+    Args:
+        user (BaseUser): The user the PDF was rendered for.
+        digest (str): The inputs digest of the PDF.
+        content (bytes): The rendered document.
+
+    Returns:
+        dict: The stored manifest.
+    """
+    manifest = {
+        "user_id": user.id,
+        "input_digest": digest,
+        "output_sha256": hashlib.sha256(content).hexdigest(),
+        "size": len(content),
+        "template_version": settings.PDF_TEMPLATE_VERSION,
+    }
+    tiered_cache.set(
+        pdf_manifest_key(digest), signing.dumps(manifest, salt=MANIFEST_SALT), timeout=settings.PDF_MANIFEST_TTL
+    )
+    return manifest
+
+
+def load_pdf_manifest(digest: str) -> dict | None:
+    """
+    Returns the manifest stored for an inputs digest, or None when it is
+    missing or its signature does not match.
+    """
+    signed_manifest = tiered_cache.get(pdf_manifest_key(digest))
+    if signed_manifest is None:
+        return None
+    try:
+        return signing.loads(signed_manifest, salt=MANIFEST_SALT)
+    except signing.BadSignature:
+        return None
+
+
+def verify_pdf_artifact(*, user: BaseUser, pdf_name: str, deep: bool = False, template: str | None = None) -> bool:
+    """
+    Checks that a PDF is the complete document rendered for the user's inputs.
+
+    The check compares the signed manifest with the user's current inputs
+    and the stored file size, which takes constant time whatever the size
+    of the document. With ``deep`` the bytes are also hashed and compared
+    with the recorded output hash.
+
+    Args:
+        user (BaseUser): The user the PDF should belong to.
+        pdf_name (str): The storage name of the PDF to check.
+        deep (bool): Whether to also hash the whole file.
+        template (str | None): The PDF template the PDF was rendered with.
+
+    Returns:
+        bool: Whether the PDF matches its manifest.
+    """
+    digest = pdf_input_digest(user, template)
+    manifest = load_pdf_manifest(digest)
+    if manifest is None or manifest["user_id"] != user.id or manifest["input_digest"] != digest:
+        return False
+    if pdf_name != pdf_artifact_name(user.id, digest):
+        return False
+    if file_size(get_pdf_storage(), pdf_name) != manifest["size"]:
+        return False
+    if deep:
+        hasher = hashlib.sha256()
+        with get_pdf_storage().open(pdf_name, "rb") as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest() == manifest["output_sha256"]
+    return True
@@ -0,0 +1,284 @@
+import logging
+import time
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from pdfmaker.common.redis_client import get_redis_client, redis_script
+from pdfmaker.common.tiered_cache import INVALIDATION_CHANNEL, tiered_cache
+
+from .models import Profile
+from .profile_cache import bump_profile_versions, profile_version_key
+
+logger = logging.getLogger(__name__)
+
+# Counter fields of Profile that are incremented through Redis
+PROFILE_COUNTER_FIELDS = ("posts_count", "subscriber_count", "subscription_count")
+
+# Counter fields of Profile and the keys they were cached under in the
+# profile_{email} snapshots, see drain_profile_snapshots
+PROFILE_SNAPSHOT_KEYS = {
+    "posts_count": "posts_count",
+    "subscriber_count": "subscribers_count",
+    "subscription_count": "subscriptions_count",
+}
+
+# Users whose profile has increments that are not in the database yet
+PROFILE_COUNTERS_DIRTY_KEY = "profile_counters_dirty"
+
+# Adds to a counter, marks the profile dirty and bumps the profile version
+# (see profile_cache), publishing its invalidation, in a single round trip
+_increment = redis_script("""
+local value = redis.call('HINCRBY', KEYS[1], ARGV[1], ARGV[2])
+redis.call('SADD', KEYS[2], ARGV[3])
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('INCR', KEYS[3])
+else
+    redis.call('SET', KEYS[3], ARGV[4])
+end
+redis.call('PUBLISH', ARGV[5], ARGV[6])
+return value
+""")
+
+# Claims of the flushes in progress: the hash holding the increments of
+# each batch, scored by the time it was claimed at
+PROFILE_COUNTER_CLAIMS_KEY = "profile_counter_claims"
+
+# Moves the pending increments of the given profiles (ARGV[2:]) into the
+# holding hash of a batch and records the claim, all at once: an increment
+# landing meanwhile is left for the next flush, and the claimed ones stay in
+# Redis until the batch is committed or given back, see _release
+_claim = redis_script("""
+redis.call('ZADD', KEYS[3], ARGV[1], KEYS[2])
+for i = 4, #KEYS do
+    local user_id = ARGV[i - 2]
+    local pending = redis.call('HGETALL', KEYS[i])
+    for j = 1, #pending, 2 do
+        redis.call('HINCRBY', KEYS[2], user_id .. ':' .. pending[j], pending[j + 1])
+    end
+    redis.call('DEL', KEYS[i])
+    redis.call('SREM', KEYS[1], user_id)
+end
+return redis.call('HGETALL', KEYS[2])
+""")
+
+
+def profile_counters_key(user_id: int) -> str:
+    return f"profile_counters:{user_id}"
+
+
+def increment_profile_counter(user_id: int, field: str, amount: int = 1) -> int:
+    """
+    Atomically adds to a counter of a user's profile without touching the database.
+
+    The increment is kept in a Redis hash and the profile is marked dirty,
+    until ``flush_profile_counters`` applies it to the row.
+
+    Args:
+        user_id (int): The ID of the user owning the profile.
+        field (str): One of ``PROFILE_COUNTER_FIELDS``.
+        amount (int): What to add, negative to decrement.
+
+    Returns:
+        int: The increments of the counter pending since the last flush.
+    """
+    if field not in PROFILE_COUNTER_FIELDS:
+        raise ValueError(f"{field} is not a profile counter")
+    version_key = profile_version_key(user_id)
+    value = _increment(
+        keys=[profile_counters_key(user_id), PROFILE_COUNTERS_DIRTY_KEY, version_key],
+        args=[
+            field, amount, user_id, int(time.time() * 1000),
+            INVALIDATION_CHANNEL, tiered_cache.invalidation_message([version_key]),
+        ],
+    )
+    tiered_cache.forget([version_key])
+    return value
+
+
+def get_profile_counters(profile: Profile) -> dict:
+    """
+    Returns the counters of a profile: the values of its row plus the
+    increments that were not flushed yet, never below zero.
+    """
+    pending = get_redis_client().hgetall(profile_counters_key(profile.user_id))
+    return {
+        field: max(getattr(profile, field) + int(pending.get(field, 0)), 0) for field in PROFILE_COUNTER_FIELDS
+    }
+
+
+def _claimed_deltas(claimed: list) -> dict:
+    deltas = {}
+    for i in range(0, len(claimed), 2):
+        user_id, field = claimed[i].split(":")
+        if delta := int(claimed[i + 1]):
+            deltas.setdefault(int(user_id), {})[field] = delta
+    return deltas
+
+
+def _release(claim_key: str, deltas: dict | None = None):
+    # Gives the increments of a claim back to the pending ones, for the next run
+    redis_client = get_redis_client()
+    if deltas is None:
+        deltas = _claimed_deltas([item for pair in redis_client.hgetall(claim_key).items() for item in pair])
+    pipe = redis_client.pipeline()
+    for user_id, fields in deltas.items():
+        for field, delta in fields.items():
+            pipe.hincrby(profile_counters_key(user_id), field, delta)
+        pipe.sadd(PROFILE_COUNTERS_DIRTY_KEY, user_id)
+    pipe.delete(claim_key)
+    pipe.zrem(PROFILE_COUNTER_CLAIMS_KEY, claim_key)
+    pipe.execute()
+
+
+def _release_abandoned_claims() -> int:
+    # A flush still running after the time limit of its task was killed
+    cutoff = time.time() - settings.PROFILE_COUNTER_FLUSH_TIME_LIMIT
+    claim_keys = get_redis_client().zrangebyscore(PROFILE_COUNTER_CLAIMS_KEY, "-inf", cutoff)
+    for claim_key in claim_keys:
+        _release(claim_key)
+    if claim_keys:
+        logger.warning(f'Released {len(claim_keys)} profile counter claims of flushes that did not finish')
+    return len(claim_keys)
+
+
+def _apply(deltas: dict):
+    # One UPDATE per batch, every row getting its own delta through CASE
+    updates = {}
+    for field in PROFILE_COUNTER_FIELDS:
+        whens = [
+            When(user_id=user_id, then=Value(fields[field]))
+            for user_id, fields in deltas.items() if field in fields
+        ]
+        if whens:
+            delta = Case(*whens, default=Value(0), output_field=models.IntegerField())
+            updates[field] = Greatest(F(field) + delta, Value(0))
+    with transaction.atomic():
+        Profile.objects.filter(user_id__in=deltas).update(**updates)
+
+
+def flush_profile_counters(batch_size: int | None = None) -> dict:
+    """
+    Applies the pending counter increments to the dirty profiles only.
+
+    Dirty profiles are claimed one batch at a time: their increments are
+    moved into a holding hash of the batch, applied as ``F()`` deltas with a
+    single UPDATE, and the hash is deleted once the UPDATE is committed, so
+    concurrent increments and writes to the rows are never lost. When the
+    UPDATE fails the claimed increments are given back right away; when the
+    worker dies, the next run gives them back once the claim is older than
+    ``PROFILE_COUNTER_FLUSH_TIME_LIMIT``.
+
+    Args:
+        batch_size (int | None): Profiles flushed per batch,
+            ``PROFILE_COUNT_BATCH_SIZE`` by default.
+
+    Returns:
+        dict: The stats of the run: claims of earlier runs released,
+            batches, profiles flushed and seconds taken.
+    """
+    batch_size = batch_size or settings.PROFILE_COUNT_BATCH_SIZE
+    started = time.perf_counter()
+    stats = {"released": _release_abandoned_claims(), "batches": 0, "profiles": 0}
+    redis_client = get_redis_client()
+
+    while user_ids := redis_client.srandmember(PROFILE_COUNTERS_DIRTY_KEY, batch_size):
+        claim_key = f"profile_counters_claim:{uuid.uuid4().hex}"
+        claimed = _claim(
+            keys=[
+                PROFILE_COUNTERS_DIRTY_KEY, claim_key, PROFILE_COUNTER_CLAIMS_KEY,
+                *(profile_counters_key(user_id) for user_id in user_ids),
+            ],
+            args=[time.time(), *user_ids],
+        )
+        deltas = _claimed_deltas(claimed)
+        if deltas:
+            try:
+                _apply(deltas)
+            except Exception:
+                _release(claim_key, deltas)
+                raise
+        redis_client.pipeline().delete(claim_key).zrem(PROFILE_COUNTER_CLAIMS_KEY, claim_key).execute()
+        if deltas:
+            # Counters below zero are clamped, which readers may notice
+            bump_profile_versions(deltas)
+        stats["batches"] += 1
+        stats["profiles"] += len(deltas)
+
+    stats["seconds"] = time.perf_counter() - started
+    logger.info(f'Profile counters flushed: {stats}')
+    return stats
+
+
+def drain_profile_snapshots(batch_size: int | None = None, dry_run: bool = False) -> dict:
+    """
+    Turns the counter snapshots cached in ``profile_{email}`` into counter
+    increments and deletes them.
+
+    The snapshots used to be shown over the values of the rows and written
+    back to them. Each one is now replaced by the increments taking the
+    counters of its profile (row plus pending increments) to the snapshot,
+    so the counters shown stay the same and are written by
+    ``flush_profile_counters`` from then on.
+
+    The keys are streamed with SCAN instead of KEYS, so Redis is never
+    blocked for the whole keyspace. Each batch costs one MGET, one query
+    resolving its profiles and one pipeline reading their pending increments.
+
+    Args:
+        batch_size (int | None): Keys handled per batch,
+            ``PROFILE_COUNT_BATCH_SIZE`` by default.
+        dry_run (bool): Only count the snapshots, leaving them in place.
+
+    Returns:
+        dict: The stats of the run: keys scanned, batches, profiles whose
+            counters changed or already matched, snapshots without a profile,
+            keys not holding counters, and seconds taken.
+    """
+    batch_size = batch_size or settings.PROFILE_COUNT_BATCH_SIZE
+    started = time.perf_counter()
+    stats = {"keys": 0, "batches": 0, "drained": 0, "unchanged": 0, "missing": 0, "invalid": 0}
+    keys = cache.iter_keys("profile_*", itersize=batch_size)
+
+    while batch := list(islice(keys, batch_size)):
+        stats["keys"] += len(batch)
+        stats["batches"] += 1
+        snapshots = {
+            key: data for key, data in cache.get_many(batch).items()
+            if isinstance(data, dict) and data.keys() & set(PROFILE_SNAPSHOT_KEYS.values())
+        }
+        # Expired since the SCAN, or other profile_* keys such as the cached responses
+        stats["invalid"] += len(batch) - len(snapshots)
+        emails = {key[len("profile_"):]: key for key in snapshots}
+        profiles = list(
+            Profile.objects.filter(user__email__in=emails)
+            .select_related("user")
+            .only("user__email", *PROFILE_COUNTER_FIELDS)
+        )
+        pipe = get_redis_client().pipeline(transaction=False)
+        for profile in profiles:
+            pipe.hgetall(profile_counters_key(profile.user_id))
+        for profile, pending in zip(profiles, pipe.execute()):
+            snapshot = snapshots[emails.pop(profile.user.email)]
+            deltas = {}
+            for field, snapshot_key in PROFILE_SNAPSHOT_KEYS.items():
+                value = snapshot.get(snapshot_key)
+                if value is not None:
+                    deltas[field] = int(value) - getattr(profile, field) - int(pending.get(field, 0))
+            deltas = {field: delta for field, delta in deltas.items() if delta}
+            if not dry_run:
+                for field, delta in deltas.items():
+                    increment_profile_counter(profile.user_id, field, delta)
+            stats["drained" if deltas else "unchanged"] += 1
+        stats["missing"] += len(emails)
+        if not dry_run:
+            cache.delete_many(list(snapshots))
+
+    stats["seconds"] = time.perf_counter() - started
+    logger.info(f'Profile counter snapshots drained: {stats}')
+    return stats
@@ -0,0 +1,151 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+import redis.asyncio as aioredis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import reverse
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from pdfmaker.common.redis_client import get_redis_client
+from .artifacts import verify_pdf_artifact
+from .models import BaseUser
+from .retries import pdf_breaker_open
+from .selectors import get_pdf_artifact
+
+PDF_EVENTS_PATH = "/user/pdf/events/"
+
+_async_client = None
+
+
+def pdf_events_channel(user_id: int) -> str:
+    return f"pdf_events_{user_id}"
+
+
+def pdf_ready_event(*, task_id: str | None, pdf_name: str) -> dict:
+    return {
+        "status": "SUCCESS",
+        "task_id": task_id,
+        "pdf_path": pdf_name,
+        "download_url": reverse('user:pdf_download'),
+    }
+
+
+def publish_pdf_event(user_id: int, event: dict):
+    """
+    Notifies the clients waiting on a user's PDF events, if any.
+    """
+    get_redis_client().publish(pdf_events_channel(user_id), json.dumps(event))
+
+
+def _get_async_client():
+    global _async_client
+    if _async_client is None:
+        _async_client = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _async_client
+
+
+def _authenticate(scope) -> int | None:
+    # EventSource cannot send headers, so the access token may also come in the query string
+    token = parse_qs(scope.get("query_string", b"").decode()).get("token", [None])[0]
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            parts = value.decode().split()
+            if len(parts) == 2 and parts[0] in jwt_settings.AUTH_HEADER_TYPES:
+                token = parts[1]
+    if not token:
+        return None
+    try:
+        return AccessToken(token)[jwt_settings.USER_ID_CLAIM]
+    except (TokenError, KeyError):
+        return None
+
+
+def _current_pdf_event(user_id: int) -> dict | None:
+    # This runs outside of Django's request cycle, which usually takes care of the connections
+    close_old_connections()
+    try:
+        user = BaseUser.objects.filter(id=user_id).first()
+        if user is None:
+            return {"status": "FAILURE", "task_id": None}
+        pdf_name = get_pdf_artifact(user=user)
+        if pdf_name is not None and verify_pdf_artifact(user=user, pdf_name=pdf_name):
+            return pdf_ready_event(task_id=None, pdf_name=pdf_name)
+        if pdf_breaker_open(user_id):
+            return {"status": "FAILURE", "task_id": None}
+        return None
+    finally:
+        close_old_connections()
+
+
+async def _wait_for_disconnect(receive):
+    while (await receive())["type"] != "http.disconnect":
+        pass
+
+
+def _sse(event: str, data: dict | None = None) -> dict:
+    body = f"event: {event}\ndata: {json.dumps(data or {})}\n\n"
+    return {"type": "http.response.body", "body": body.encode(), "more_body": True}
+
+
+async def pdf_events_application(scope, receive, send):
+    """
+    ASGI application streaming the completion of the user's PDF as Server-Sent Events.
+
+    The connection is held open until ``generate_user_pdf`` publishes the
+    outcome of the render on the user's Redis channel, replacing repeated
+    polls of ``start_pdf_task/`` with a single request. A ``pdf`` event
+    carries the outcome; a ``timeout`` event is sent when nothing happened
+    within ``PDF_EVENTS_TIMEOUT`` seconds, and the client reconnects.
+    """
+    user_id = _authenticate(scope)
+    if user_id is None:
+        await send({"type": "http.response.start", "status": 401, "headers": [(b"content-type", b"application/json")]})
+        await send({
+            "type": "http.response.body", "body": b'{"detail": "Authentication credentials were not provided."}',
+        })
+        return
+
+    pubsub = _get_async_client().pubsub()
+    # Subscribe before looking at the current state, so a render finishing
+    # in between is not missed
+    await pubsub.subscribe(pdf_events_channel(user_id))
+    disconnected = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/event-stream"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+            ],
+        })
+
+        event = await sync_to_async(_current_pdf_event)(user_id)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.PDF_EVENTS_TIMEOUT
+        while event is None and not disconnected.done():
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            message = await pubsub.get_message(
+                ignore_subscribe_messages=True,
+                timeout=min(remaining, settings.PDF_EVENTS_HEARTBEAT),
+            )
+            if message is not None:
+                event = json.loads(message["data"])
+            elif not disconnected.done():
+                # Comment line, keeps proxies from closing an idle connection
+                await send({"type": "http.response.body", "body": b": keep-alive\n\n", "more_body": True})
+
+        if not disconnected.done():
+            await send(_sse("pdf", event) if event is not None else _sse("timeout"))
+            await send({"type": "http.response.body", "body": b""})
+    finally:
+        disconnected.cancel()
+        await pubsub.reset()
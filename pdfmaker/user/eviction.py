@@ -0,0 +1,208 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from pdfmaker.common.redis_client import get_redis_client, redis_script
+from pdfmaker.common.storages import get_pdf_storage
+from pdfmaker.common.tiered_cache import tiered_cache
+
+from .artifacts import pdf_manifest_key
+from .layout import pdf_artifact_digest
+
+# Sorted set of the stored PDFs scored by their last access time, the
+# hash of their sizes and the running totals of bytes and files.
+PDF_ACCESS_KEY = "pdf_access"
+PDF_SIZES_KEY = "pdf_sizes"
+PDF_USAGE_KEY = "pdf_usage"
+PDF_EVICTION_STATS_KEY = "pdf_eviction_stats"
+
+# Indexes a stored PDF and updates the totals, in a single round trip.
+# With ARGV[5] set, a PDF that is already indexed is left alone.
+_record_stored = redis_script("""
+local old = redis.call('HGET', KEYS[2], ARGV[1])
+if old and ARGV[5] == '1' then
+    return 0
+end
+redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[1])
+if old then
+    redis.call('HINCRBY', KEYS[3], 'bytes', tonumber(ARGV[2]) - tonumber(old))
+else
+    redis.call('HINCRBY', KEYS[3], 'bytes', ARGV[2])
+    redis.call('HINCRBY', KEYS[3], 'files', 1)
+end
+if ARGV[4] == '1' then
+    redis.call('HINCRBY', KEYS[4], 'misses', 1)
+end
+return 1
+""")
+
+# Drops a PDF from the index unless it was accessed after the cutoff, and
+# returns its size, or -1 when it has to be kept
+_forget = redis_script("""
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if ARGV[2] ~= '' and score and tonumber(score) > tonumber(ARGV[2]) then
+    return -1
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+local size = redis.call('HGET', KEYS[2], ARGV[1])
+if not size then
+    return 0
+end
+redis.call('HDEL', KEYS[2], ARGV[1])
+redis.call('HINCRBY', KEYS[3], 'bytes', -tonumber(size))
+redis.call('HINCRBY', KEYS[3], 'files', -1)
+return tonumber(size)
+""")
+
+
+def record_pdf_stored(pdf_name: str, size: int, *, accessed_at: float | None = None) -> bool:
+    """
+    Adds a PDF to the access-time index, and forgets the cached lookups
+    that did not find it (see ``selectors.get_pdf_artifact``).
+
+    Args:
+        pdf_name (str): The storage name of the PDF.
+        size (int): The size of the PDF in bytes.
+        accessed_at (float | None): When the PDF was last accessed, for PDFs
+            stored before they were indexed; those are only added when they
+            are not indexed yet. None for a PDF that was just rendered, which
+            counts as a miss of the stored PDFs.
+
+    Returns:
+        bool: Whether the PDF was indexed.
+    """
+    rendered = accessed_at is None
+    # A lookup made before it was stored may remember it as missing
+    tiered_cache.delete(pdf_artifact_key(pdf_name))
+    return bool(_record_stored(
+        keys=[PDF_ACCESS_KEY, PDF_SIZES_KEY, PDF_USAGE_KEY, PDF_EVICTION_STATS_KEY],
+        args=[pdf_name, size, time.time() if rendered else accessed_at, int(rendered), int(not rendered)],
+    ))
+
+
+def touch_pdf(pdf_name: str):
+    """
+    Records an access to a stored PDF, which counts as a hit, moves it to
+    the back of the eviction order and extends the life of its manifest.
+    """
+    pipe = get_redis_client().pipeline(transaction=False)
+    pipe.zadd(PDF_ACCESS_KEY, {pdf_name: time.time()}, xx=True)
+    pipe.hincrby(PDF_EVICTION_STATS_KEY, "hits", 1)
+    pipe.execute()
+    digest = pdf_artifact_digest(pdf_name)
+    if digest is not None:
+        cache.touch(pdf_manifest_key(digest), settings.PDF_MANIFEST_TTL)
+
+
+def forget_pdf(pdf_name: str, accessed_before: float | None = None) -> int:
+    """
+    Removes a PDF from the access-time index.
+
+    Args:
+        pdf_name (str): The storage name of the PDF.
+        accessed_before (float | None): Keep the PDF indexed if it was
+            accessed after this timestamp.
+
+    Returns:
+        int: The size of the removed PDF, or -1 when it was kept.
+    """
+    return _forget(
+        keys=[PDF_ACCESS_KEY, PDF_SIZES_KEY, PDF_USAGE_KEY],
+        args=[pdf_name, "" if accessed_before is None else accessed_before],
+    )
+
+
+def pdf_artifact_key(pdf_name: str) -> str:
+    return f"pdf_artifact_{pdf_name}"
+
+
+def delete_stored_pdf(pdf_name: str):
+    """
+    Deletes a stored PDF along with its manifest, and the cached lookups
+    that still find it (see ``selectors.get_pdf_artifact``).
+    """
+    get_pdf_storage().delete(pdf_name)
+    tiered_cache.delete(pdf_artifact_key(pdf_name))
+    digest = pdf_artifact_digest(pdf_name)
+    if digest is not None:
+        tiered_cache.delete(pdf_manifest_key(digest))
+
+
+def _over_quota(usage: dict, ratio: float) -> bool:
+    quota_bytes, quota_files = settings.PDF_STORAGE_QUOTA_BYTES, settings.PDF_STORAGE_QUOTA_FILES
+    return (
+        (quota_bytes > 0 and usage["bytes"] > quota_bytes * ratio)
+        or (quota_files > 0 and usage["files"] > quota_files * ratio)
+    )
+
+
+def get_pdf_usage() -> dict:
+    usage = get_redis_client().hgetall(PDF_USAGE_KEY)
+    return {"bytes": int(usage.get("bytes", 0)), "files": int(usage.get("files", 0))}
+
+
+def _evict(pdf_name: str, cutoff: float, run: dict) -> int:
+    # Claim the PDF in the index first, so one accessed or published again
+    # since it was listed is not deleted
+    size = forget_pdf(pdf_name, accessed_before=cutoff)
+    if size >= 0:
+        delete_stored_pdf(pdf_name)
+        run["evicted_files"] += 1
+        run["bytes_reclaimed"] += size
+    return size
+
+
+def evict_pdfs() -> dict:
+    """
+    Deletes the PDFs idle for too long, then the least recently accessed
+    PDFs while the storage quotas are exceeded.
+
+    PDFs not accessed for ``PDF_ARTIFACT_MAX_IDLE`` seconds are always
+    deleted, before their manifest expires. Below
+    ``PDF_STORAGE_QUOTA_BYTES``/``PDF_STORAGE_QUOTA_FILES`` nothing else
+    happens. Above either of them PDFs are deleted, oldest access first,
+    until the usage is back under ``PDF_EVICTION_TARGET_RATIO`` of the
+    quotas. PDFs accessed within ``PDF_EVICTION_MIN_AGE`` seconds are kept,
+    and an evicted PDF is simply rendered again by ``generate_user_pdf``
+    when it is requested.
+
+    Returns:
+        dict: The number of files evicted and bytes reclaimed by this run.
+    """
+    run = {"evicted_files": 0, "bytes_reclaimed": 0}
+    redis_client = get_redis_client()
+
+    idle_cutoff = time.time() - settings.PDF_ARTIFACT_MAX_IDLE
+    while pdf_names := redis_client.zrangebyscore(
+        PDF_ACCESS_KEY, "-inf", idle_cutoff, start=0, num=settings.PDF_EVICTION_BATCH_SIZE,
+    ):
+        evicted = [_evict(pdf_name, idle_cutoff, run) for pdf_name in pdf_names]
+        if all(size < 0 for size in evicted):
+            break
+
+    usage = get_pdf_usage()
+    if _over_quota(usage, 1):
+        cutoff = time.time() - settings.PDF_EVICTION_MIN_AGE
+        while _over_quota(usage, settings.PDF_EVICTION_TARGET_RATIO):
+            pdf_names = redis_client.zrangebyscore(
+                PDF_ACCESS_KEY, "-inf", cutoff, start=0, num=settings.PDF_EVICTION_BATCH_SIZE,
+            )
+            if not pdf_names:
+                break
+            for pdf_name in pdf_names:
+                size = _evict(pdf_name, cutoff, run)
+                if size < 0:
+                    continue
+                usage = {"bytes": usage["bytes"] - size, "files": usage["files"] - 1}
+                if not _over_quota(usage, settings.PDF_EVICTION_TARGET_RATIO):
+                    break
+            # Renders keep publishing while this runs
+            usage = get_pdf_usage()
+
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hincrby(PDF_EVICTION_STATS_KEY, "evicted_files", run["evicted_files"])
+    pipe.hincrby(PDF_EVICTION_STATS_KEY, "bytes_reclaimed", run["bytes_reclaimed"])
+    pipe.execute()
+    return run
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import re
+
+# Two levels of 256 directories each, e.g. "pdfs/3f/a2/...", so that no
+# directory ever holds more than a small share of the files.
+SHARD_LEVELS = 2
+
+PDF_DIR = "pdfs"
+# File name of a PDF artifact, see pdf_artifact_name
+PDF_NAME_RE = re.compile(r"^user_(?P<user_id>\d+)_(?P<digest>[0-9a-f]{64})\.pdf$")
+SIGNATURE_DIR = "signatures"
+RENDERED_SIGNATURE_DIR = "signatures/rendered"
+
+
+def shard(key) -> str:
+    """
+    Returns the sharded directories a key is stored under, e.g. "3f/a2".
+
+    The shards come from a hash of the key, so the keys spread evenly over
+    the directories whatever their distribution.
+    """
+    digest = hashlib.md5(str(key).encode()).hexdigest()
+    return "/".join(digest[2 * level:2 * level + 2] for level in range(SHARD_LEVELS))
+
+
+def user_pdf_prefix(user_id: int) -> str:
+    """
+    Returns the storage name prefix shared by every PDF artifact of a user.
+    """
+    return f"{PDF_DIR}/{shard(user_id)}/user_{user_id}"
+
+
+def pdf_artifact_name(user_id: int, digest: str) -> str:
+    """
+    Returns the storage name of the PDF artifact rendered for the given inputs digest.
+    """
+    return f"{user_pdf_prefix(user_id)}_{digest}.pdf"
+
+
+def pdf_artifact_digest(pdf_name: str) -> str | None:
+    """
+    Returns the inputs digest a PDF artifact was rendered for, or None when
+    the name is not the one of an artifact.
+    """
+    match = PDF_NAME_RE.match(os.path.basename(pdf_name))
+    return match["digest"] if match else None
+
+
+def _user_upload_to(directory: str, instance, filename: str) -> str:
+    # Users upload signatures once they exist, the file name is only a fallback
+    return f"{directory}/{shard(instance.pk or filename)}/{os.path.basename(filename)}"
+
+
+def signature_upload_to(instance, filename: str) -> str:
+    return _user_upload_to(SIGNATURE_DIR, instance, filename)
+
+
+def rendered_signature_upload_to(instance, filename: str) -> str:
+    return _user_upload_to(RENDERED_SIGNATURE_DIR, instance, filename)
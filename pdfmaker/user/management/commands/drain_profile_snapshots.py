@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from pdfmaker.user.counters import drain_profile_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Replaces the profile_{email} counter snapshots left in the cache with "
+        "increments of the profile counters, then deletes them. Run once when "
+        "deploying the write-behind counters, after stopping whatever still "
+        "writes the snapshots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=None, help="Keys handled per batch.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the snapshots to drain.")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        stats = drain_profile_snapshots(batch_size=batch_size, dry_run=dry_run)
+        prefix = "Would drain" if dry_run else "Drained"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats['drained']} profile snapshots, {stats['unchanged']} unchanged, "
+            f"{stats['missing']} without a profile, {stats['invalid']} other keys"
+        ))
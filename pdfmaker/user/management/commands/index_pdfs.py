@@ -0,0 +1,26 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from pdfmaker.common.storages import get_pdf_storage, walk_files
+from pdfmaker.user.eviction import record_pdf_stored
+from pdfmaker.user.layout import PDF_DIR, PDF_NAME_RE
+
+
+class Command(BaseCommand):
+    help = (
+        "Adds the PDFs stored before the access-time index existed to it, so "
+        "the eviction also considers them. Their modification time stands in "
+        "for their last access. PDFs that are already indexed are left alone."
+    )
+
+    def handle(self, *args, **options):
+        files = 0
+        size_total = 0
+        for name, size, modified_at in walk_files(get_pdf_storage(), PDF_DIR):
+            if PDF_NAME_RE.match(os.path.basename(name)) is None:
+                continue
+            if record_pdf_stored(name, size, accessed_at=modified_at):
+                files += 1
+                size_total += size
+        self.stdout.write(self.style.SUCCESS(f"Indexed {files} PDFs, {size_total} bytes"))
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from pdfmaker.user.models import BaseUser
+from pdfmaker.user.services import delete_pdf, ensure_signature_rendered
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the render-ready variant of the signatures uploaded before "
+        "variants existed, and removes the PDFs rendered from the originals. "
+        "Safe to run while the site is up: a user whose signature changed "
+        "meanwhile is skipped, the upload built its variant already."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Users loaded per query.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the signatures to normalise.")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        users = (
+            BaseUser.objects.exclude(signature="").exclude(signature__isnull=True)
+            .filter(Q(signature_rendered="") | Q(signature_rendered__isnull=True))
+            .order_by("id")
+        )
+        if dry_run:
+            self.stdout.write(self.style.SUCCESS(f"Would normalise {users.count()} signatures"))
+            return
+
+        stats = {"normalised": 0, "skipped": 0, "failed": 0}
+        for user in users.iterator(chunk_size=batch_size):
+            try:
+                normalised = ensure_signature_rendered(user)
+            except Exception as e:
+                self.stderr.write(f"Signature of user {user.id} could not be normalised: {e}")
+                stats["failed"] += 1
+                continue
+            if normalised:
+                delete_pdf(user)
+                stats["normalised"] += 1
+            else:
+                stats["skipped"] += 1
+        self.stdout.write(self.style.SUCCESS(
+            f"Normalised {stats['normalised']} signatures, skipped {stats['skipped']}, failed {stats['failed']}"
+        ))
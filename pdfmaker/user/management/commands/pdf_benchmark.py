@@ -0,0 +1,190 @@
+import json
+import math
+import os
+import platform
+import queue
+import resource
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.files import File
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from pdfmaker.common.redis_client import redis_client_stats
+from pdfmaker.common.stages import connect_stage_listener, disconnect_stage_listener
+from pdfmaker.user.layout import PDF_NAME_RE
+from pdfmaker.user.renderer import init_renderer
+from pdfmaker.user.services import check_task_status, enqueue_user_pdf, register, update_or_add_signature
+
+BENCHMARK_SETTINGS = "config.django.benchmark"
+
+
+def _summary(samples: list[float], wall_seconds: float | None = None) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def percentile(q):
+        # Nearest-rank percentile
+        return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+    summary = {
+        "count": len(ordered),
+        "mean_seconds": sum(ordered) / len(ordered),
+        "p50_seconds": percentile(0.50),
+        "p95_seconds": percentile(0.95),
+        "p99_seconds": percentile(0.99),
+        "max_seconds": ordered[-1],
+    }
+    if wall_seconds:
+        summary["throughput_per_second"] = len(ordered) / wall_seconds
+    return summary
+
+
+def _peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the PDF pipeline: every request enqueues a render with "
+        "enqueue_user_pdf (the task runs inline) and checks it with "
+        "check_task_status. Reports the throughput and the latency "
+        "percentiles of both, of the whole request and of every render stage, "
+        "and the peak RSS of the process, as JSON. Run it with "
+        f"DJANGO_SETTINGS_MODULE={BENCHMARK_SETTINGS}, which only needs "
+        "SQLite and an in-process Redis stand-in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50, help="Timed PDF requests, one new user each.")
+        parser.add_argument("--concurrency", type=int, default=4, help="Threads sending the requests.")
+        parser.add_argument("--warmup", type=int, default=2, help="Untimed requests sent first.")
+        parser.add_argument("--signatures", default=os.path.join(settings.BASE_DIR, "media", "signatures"))
+        parser.add_argument("--template", choices=list(settings.PDF_TEMPLATES), default=None)
+        parser.add_argument("--profile", choices=list(settings.PDF_OUTPUT_PROFILES), default=None)
+        parser.add_argument("--output", help="Write the report to this file instead of stdout.")
+
+    def handle(self, *args, requests, concurrency, warmup, signatures, template, profile, output, **options):
+        if settings.SETTINGS_MODULE != BENCHMARK_SETTINGS:
+            raise CommandError(f"Run the benchmark with DJANGO_SETTINGS_MODULE={BENCHMARK_SETTINGS}")
+        if profile is not None:
+            settings.PDF_OUTPUT_PROFILE = profile
+
+        samples = sorted(
+            os.path.join(signatures, filename) for filename in os.listdir(signatures)
+            if os.path.isfile(os.path.join(signatures, filename))
+        )
+        if not samples:
+            raise CommandError(f"No sample signatures in {signatures}")
+
+        call_command("migrate", verbosity=0)
+        init_renderer()
+        users = self._create_users(warmup + requests, samples)
+
+        for user in users[:warmup]:
+            self._request(user, template)
+
+        stages = defaultdict(list)
+        lock = threading.Lock()
+
+        def record_stage(name, seconds):
+            with lock:
+                stages[name].append(seconds)
+
+        timings = {"generate_user_pdf": [], "check_task_status": [], "end_to_end": []}
+        errors = []
+        pending = queue.Queue()
+        for user in users[warmup:]:
+            pending.put(user)
+
+        def work():
+            try:
+                while True:
+                    try:
+                        user = pending.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        generate_seconds, check_seconds = self._request(user, template)
+                    except Exception as e:
+                        with lock:
+                            errors.append(f"user {user.id}: {e}")
+                        continue
+                    with lock:
+                        timings["generate_user_pdf"].append(generate_seconds)
+                        timings["check_task_status"].append(check_seconds)
+                        timings["end_to_end"].append(generate_seconds + check_seconds)
+            finally:
+                connections.close_all()
+
+        rss_before = _peak_rss_bytes()
+        round_trips_before = redis_client_stats()["round_trips"]
+        connect_stage_listener(record_stage)
+        started = time.perf_counter()
+        try:
+            threads = [threading.Thread(target=work) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            disconnect_stage_listener(record_stage)
+        wall_seconds = time.perf_counter() - started
+
+        report = {
+            "config": {
+                "requests": requests,
+                "concurrency": concurrency,
+                "warmup": warmup,
+                "template": template or settings.PDF_DEFAULT_TEMPLATE,
+                "profile": settings.PDF_OUTPUT_PROFILE,
+                "signatures": len(samples),
+                "database": settings.DATABASES["default"]["ENGINE"],
+                "python": platform.python_version(),
+            },
+            "wall_seconds": wall_seconds,
+            "errors": errors,
+            "operations": {name: _summary(values, wall_seconds) for name, values in timings.items()},
+            "stages": {name: _summary(values) for name, values in sorted(stages.items())},
+            "redis_round_trips_per_request": (
+                (redis_client_stats()["round_trips"] - round_trips_before) / requests if requests else None
+            ),
+            "peak_rss_bytes": _peak_rss_bytes(),
+            "peak_rss_before_run_bytes": rss_before,
+        }
+        content = json.dumps(report, indent=2)
+        if output:
+            with open(output, "w") as f:
+                f.write(content)
+        else:
+            self.stdout.write(content)
+
+    def _create_users(self, count: int, samples: list[str]) -> list:
+        # Fresh users every run, so every timed request renders a new PDF
+        run = uuid.uuid4().hex[:8]
+        users = []
+        for i in range(count):
+            user = register(name=f"Benchmark User {i}", email=f"bench_{run}_{i}@example.com", password=run, bio=None)
+            with open(samples[i % len(samples)], "rb") as f:
+                update_or_add_signature(File(f, name=os.path.basename(f.name)), user)
+            user.refresh_from_db()
+            users.append(user)
+        return users
+
+    def _request(self, user, template: str | None) -> tuple[float, float]:
+        started = time.perf_counter()
+        task_id = enqueue_user_pdf(user, template=template)
+        generated = time.perf_counter()
+        result = check_task_status(task_id, user.id)
+        checked = time.perf_counter()
+        if PDF_NAME_RE.match(os.path.basename(result)) is None:
+            raise RuntimeError(result)
+        return generated - started, checked - generated
@@ -0,0 +1,62 @@
+import io
+import json
+import os
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from pdfmaker.user.models import BaseUser
+from pdfmaker.user.renderer import get_pdf_template, render_pdf, renderer_stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Renders sample PDFs with every template and output profile and "
+        "reports their size and render time as JSON, along with the cold and "
+        "warm render times of each engine. The sample signatures are read "
+        "from a directory, MEDIA_ROOT/signatures by default."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--signatures", default=os.path.join(settings.MEDIA_ROOT, "signatures"))
+        parser.add_argument("--samples", type=int, default=10, help="Signatures rendered per profile.")
+        parser.add_argument("--repeat", type=int, default=3, help="Renders per signature and profile.")
+        parser.add_argument("--profile", action="append", help="Only report these profiles.")
+        parser.add_argument("--template", action="append", help="Only report these templates.")
+
+    def handle(self, *args, signatures, samples, repeat, profile, template, **options):
+        images = []
+        for filename in sorted(os.listdir(signatures))[:samples]:
+            path = os.path.join(signatures, filename)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    images.append((filename, f.read()))
+        if not images:
+            self.stderr.write(f"No sample signatures in {signatures}")
+            return
+
+        report = {"templates": {}}
+        for template_name in template or settings.PDF_TEMPLATES:
+            report["templates"][template_name] = results = {"engine": get_pdf_template(template_name)["engine"]}
+            for name in profile or settings.PDF_OUTPUT_PROFILES:
+                sizes, seconds = [], []
+                for filename, image in images:
+                    user = BaseUser(name="Sample User", email="sample@example.com", signature=filename)
+                    for _ in range(repeat):
+                        started = time.perf_counter()
+                        content = render_pdf(
+                            user=user, template=template_name, signature_image=io.BytesIO(image), profile=name,
+                        )
+                        seconds.append(time.perf_counter() - started)
+                    sizes.append(len(content))
+                results[name] = {
+                    "samples": len(images),
+                    "size_avg_bytes": statistics.mean(sizes),
+                    "size_max_bytes": max(sizes),
+                    "render_avg_seconds": statistics.mean(seconds),
+                    "render_p95_seconds": statistics.quantiles(seconds, n=20)[-1] if len(seconds) > 1 else seconds[0],
+                }
+        report["engines"] = renderer_stats()
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,88 @@
+import os
+import re
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from pdfmaker.common.storages import get_pdf_storage, is_local_storage, save_file
+from pdfmaker.user.layout import PDF_DIR, PDF_NAME_RE, pdf_artifact_name
+from pdfmaker.user.models import BaseUser
+
+LEGACY_PDF_RE = re.compile(r"^user_\d+\.pdf$")
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves signatures and generated PDFs from the flat media directories "
+        "into the sharded layout. Safe to run while the site is up: a file is "
+        "copied to its new name before the old one is removed, and a user row "
+        "only points at the new signature if it was not changed meanwhile. "
+        "A PDF requested before it was moved is simply rendered again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500, help="Users loaded per query.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the files to move.")
+
+    def handle(self, *args, batch_size, dry_run, **options):
+        stats = {"signatures": 0, "pdfs": 0, "legacy_pdfs_removed": 0, "skipped": 0}
+        self._move_signatures(stats, batch_size, dry_run)
+        self._move_pdfs(stats, dry_run)
+        self.stdout.write(self.style.SUCCESS(
+            ("Would move" if dry_run else "Moved")
+            + f" {stats['signatures']} signatures and {stats['pdfs']} PDFs, "
+            f"removed {stats['legacy_pdfs_removed']} legacy PDFs, skipped {stats['skipped']}"
+        ))
+
+    def _move_signatures(self, stats: dict, batch_size: int, dry_run: bool):
+        users = (
+            BaseUser.objects.exclude(signature="").exclude(signature__isnull=True)
+            .only("id", "signature", "signature_rendered")
+            .order_by("id")
+        )
+        for user in users.iterator(chunk_size=batch_size):
+            for field_name in ("signature", "signature_rendered"):
+                file = getattr(user, field_name)
+                if not file:
+                    continue
+                old_name = file.name
+                new_name = file.field.generate_filename(user, os.path.basename(old_name))
+                if os.path.dirname(old_name) == os.path.dirname(new_name):
+                    continue
+                stats["signatures"] += 1
+                if dry_run:
+                    continue
+                if not default_storage.exists(old_name):
+                    stats["skipped"] += 1
+                    continue
+                with default_storage.open(old_name, "rb") as content:
+                    new_name = default_storage.save(new_name, content)
+                updated = BaseUser.objects.filter(id=user.id, **{field_name: old_name}).update(**{field_name: new_name})
+                # When the user replaced the file in the meantime, the copy is the one to drop
+                default_storage.delete(old_name if updated else new_name)
+
+    def _move_pdfs(self, stats: dict, dry_run: bool):
+        storage = get_pdf_storage()
+        if is_local_storage(storage) and not storage.exists(PDF_DIR):
+            return
+        _, files = storage.listdir(PDF_DIR)
+        for filename in files:
+            old_name = f"{PDF_DIR}/{filename}"
+            if LEGACY_PDF_RE.match(filename):
+                # Written before artifacts were digest keyed, they are never served anymore
+                stats["legacy_pdfs_removed"] += 1
+                if not dry_run:
+                    storage.delete(old_name)
+                continue
+            match = PDF_NAME_RE.match(filename)
+            if match is None:
+                stats["skipped"] += 1
+                continue
+            stats["pdfs"] += 1
+            if dry_run:
+                continue
+            new_name = pdf_artifact_name(int(match["user_id"]), match["digest"])
+            if not storage.exists(new_name):
+                with storage.open(old_name, "rb") as content:
+                    save_file(storage, new_name, content.read())
+            storage.delete(old_name)
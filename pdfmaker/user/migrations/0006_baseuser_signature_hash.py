@@ -0,0 +1,35 @@
+# Generated by Django 4.0.7 on 2026-10-17 09:12
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def backfill_signature_hash(apps, schema_editor):
+    BaseUser = apps.get_model('user', 'BaseUser')
+    for user in BaseUser.objects.exclude(signature='').exclude(signature__isnull=True).iterator():
+        hasher = hashlib.sha256()
+        try:
+            with user.signature.open('rb') as signature:
+                for chunk in signature.chunks():
+                    hasher.update(chunk)
+        except OSError:
+            continue
+        user.signature_hash = hasher.hexdigest()
+        user.save(update_fields=['signature_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0005_alter_baseuser_signature'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='baseuser',
+            name='signature_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_signature_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.0.7 on 2026-10-17 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0006_baseuser_signature_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='baseuser',
+            name='signature_rendered',
+            field=models.ImageField(blank=True, null=True, upload_to='signatures/rendered/'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.0.7 on 2026-10-17 06:57
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0007_baseuser_signature_rendered'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PdfJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('task_id', models.CharField(max_length=255, unique=True)),
+                ('state', models.CharField(choices=[('PENDING', 'Pending'), ('STARTED', 'Started'), ('RETRY', 'Retry'), ('SUCCESS', 'Success'), ('FAILURE', 'Failure')], default='PENDING', max_length=16)),
+                ('input_digest', models.CharField(max_length=64)),
+                ('artifact', models.CharField(blank=True, default='', max_length=500)),
+                ('output_sha256', models.CharField(blank=True, default='', max_length=64)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pdf_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pdfjob',
+            index=models.Index(fields=['state', 'created_at'], name='user_pdfjob_state_7dce18_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdfjob',
+            index=models.Index(fields=['user', '-created_at'], name='user_pdfjob_user_id_7745f5_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.7 on 2026-10-17 07:05
+
+from django.db import migrations, models
+import pdfmaker.user.layout
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0008_pdfjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='baseuser',
+            name='signature',
+            field=models.ImageField(blank=True, null=True, upload_to=pdfmaker.user.layout.signature_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='baseuser',
+            name='signature_rendered',
+            field=models.ImageField(blank=True, null=True, upload_to=pdfmaker.user.layout.rendered_signature_upload_to),
+        ),
+    ]
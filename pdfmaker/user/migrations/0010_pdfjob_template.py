@@ -0,0 +1,18 @@
+# Generated by Django 4.0.7 on 2026-10-17 07:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0009_sharded_upload_paths'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdfjob',
+            name='template',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.0.7 on 2026-10-17 09:12
+
+from django.db import migrations
+
+# The task that wrote the profile_{email} counter snapshots is gone, the
+# counters are only written through pdfmaker.user.counters now
+REMOVED_TASK = 'pdfmaker.user.tasks.profile_count_update'
+
+
+def remove_periodic_tasks(apps, schema_editor):
+    PeriodicTask = apps.get_model('django_celery_beat', 'PeriodicTask')
+    PeriodicTask.objects.filter(task=REMOVED_TASK).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('user', '0010_pdfjob_template'),
+        ('django_celery_beat', '0016_alter_crontabschedule_timezone'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_periodic_tasks, migrations.RunPython.noop),
+    ]
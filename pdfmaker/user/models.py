@@ -1,5 +1,6 @@
 from django.db import models
 from pdfmaker.common.models import BaseModel
+from .layout import signature_upload_to, rendered_signature_upload_to
 
 from django.contrib.auth.models import AbstractBaseUser
 from django.contrib.auth.models import BaseUserManager as BUM
@@ -44,7 +45,10 @@ class BaseUser(BaseModel, AbstractBaseUser, PermissionsMixin):
 
     is_active = models.BooleanField(default=True)
     is_admin = models.BooleanField(default=False)
-    signature = models.ImageField(upload_to='signatures/', blank=True, null=True)
+    signature = models.ImageField(upload_to=signature_upload_to, blank=True, null=True)
+    signature_hash = models.CharField(max_length=64, blank=True, default="")
+    # Downscaled, compressed copy of the signature that is embedded in PDFs
+    signature_rendered = models.ImageField(upload_to=rendered_signature_upload_to, blank=True, null=True)
 
     objects = BaseUserManager()
 
@@ -66,3 +70,34 @@ class Profile(models.Model):
 
     def __str__(self):
         return f"{self.user} >> {self.bio}"
+
+
+class PdfJob(BaseModel):
+    class State(models.TextChoices):
+        PENDING = "PENDING"
+        STARTED = "STARTED"
+        RETRY = "RETRY"
+        SUCCESS = "SUCCESS"
+        FAILURE = "FAILURE"
+
+    # The ID of the Celery task rendering the PDF, which is what clients know the job by
+    task_id = models.CharField(max_length=255, unique=True)
+    user = models.ForeignKey(BaseUser, on_delete=models.CASCADE, related_name="pdf_jobs")
+    state = models.CharField(max_length=16, choices=State.choices, default=State.PENDING)
+    # The PDF template the job renders, see PDF_TEMPLATES
+    template = models.CharField(max_length=50, blank=True, default="")
+    input_digest = models.CharField(max_length=64)
+    artifact = models.CharField(max_length=500, blank=True, default="")
+    output_sha256 = models.CharField(max_length=64, blank=True, default="")
+    attempts = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "created_at"]),
+            models.Index(fields=["user", "-created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.task_id} >> {self.state}"
@@ -0,0 +1,147 @@
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.http import parse_etags
+
+from pdfmaker.common.redis_client import redis_script
+from pdfmaker.common.tiered_cache import INVALIDATION_CHANNEL, tiered_cache
+
+from .models import BaseUser, Profile
+
+# Version of the profile of every user, bumped whenever the profile or its
+# counters change. Cached responses and ETags are tied to the version they
+# were built for, so a bump invalidates both without deleting anything.
+#
+# Versions and responses are also kept in the memory of every process (see
+# tiered_cache), which drops them when told a version was bumped.
+#
+# A missing version starts at the current time in milliseconds rather than
+# at 1, so versions never go back to values handed out before Redis lost them.
+_get_version = redis_script("""
+local version = redis.call('GET', KEYS[1])
+if not version then
+    version = ARGV[1]
+    redis.call('SET', KEYS[1], version)
+end
+return version
+""")
+
+_bump_versions = redis_script("""
+for _, key in ipairs(KEYS) do
+    if redis.call('EXISTS', key) == 1 then
+        redis.call('INCR', key)
+    else
+        redis.call('SET', key, ARGV[1])
+    end
+end
+redis.call('PUBLISH', ARGV[2], ARGV[3])
+""")
+
+
+def profile_version_key(user_id: int) -> str:
+    return f"profile_version:{user_id}"
+
+
+def profile_response_key(user_id: int) -> str:
+    return f"profile_response:{user_id}"
+
+
+def user_active_key(user_id: int) -> str:
+    return f"user_active:{user_id}"
+
+
+def _version_seed() -> int:
+    return int(time.time() * 1000)
+
+
+def get_profile_version(user_id: int) -> str:
+    key = profile_version_key(user_id)
+    return tiered_cache.get(key, load=lambda: _get_version(keys=[key], args=[_version_seed()]))
+
+
+def bump_profile_versions(user_ids):
+    """
+    Invalidates the cached profile responses and ETags of the given users.
+    """
+    keys = [profile_version_key(user_id) for user_id in user_ids]
+    if keys:
+        _bump_versions(
+            keys=keys,
+            args=[_version_seed(), INVALIDATION_CHANNEL, tiered_cache.invalidation_message(keys)],
+        )
+        tiered_cache.forget(keys)
+
+
+def is_user_active(user_id: int) -> bool:
+    """
+    Returns whether a user exists and is active, cached until the user changes.
+
+    Views authenticating from the access token alone check it instead of
+    loading the user, so a deactivated user is turned away as soon as the
+    change is committed.
+    """
+    key = user_active_key(user_id)
+    active = tiered_cache.get(key)
+    if active is None:
+        active = BaseUser.objects.filter(id=user_id, is_active=True).exists()
+        tiered_cache.set(key, active, timeout=settings.PROFILE_CACHE_TTL)
+    return active
+
+
+def profile_etag(user_id: int, version: str) -> str:
+    return f'W/"profile-{user_id}-{version}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Weakly compares an ``If-None-Match`` header with an ETag, see RFC 9110.
+    """
+    if not if_none_match:
+        return False
+    etags = parse_etags(if_none_match)
+    return "*" in etags or etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in etags}
+
+
+def get_profile_response(user_id: int, version: str, build) -> dict:
+    """
+    Returns the profile response of a user, cached per version of the profile.
+
+    Concurrent requests missing the cache wait for a single build, and the
+    response of the previous version is served while it is rebuilt, see
+    ``TieredCache.get_or_compute``.
+
+    Args:
+        user_id (int): The ID of the user owning the profile.
+        version (str): The current version of the profile.
+        build: Callable building the response from the database.
+
+    Returns:
+        dict: The response and the version it was built for, under ``data``
+        and ``version``; the ETag must be the one of that version.
+    """
+    return tiered_cache.get_or_compute(
+        profile_response_key(user_id),
+        lambda: {"version": version, "data": build()},
+        settings.PROFILE_CACHE_TTL,
+        name="profile",
+        version=version,
+    )
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_profile(instance, **kwargs):
+    # Only once committed: a response rebuilt before that still reads the
+    # old row, and would otherwise be cached under the new version
+    transaction.on_commit(lambda: bump_profile_versions([instance.user_id]))
+
+
+@receiver([post_save, post_delete], sender=BaseUser)
+def invalidate_user(instance, **kwargs):
+    def invalidate():
+        tiered_cache.delete(user_active_key(instance.id))
+        bump_profile_versions([instance.id])
+
+    transaction.on_commit(invalidate)
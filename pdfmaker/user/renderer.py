@@ -0,0 +1,388 @@
+import base64
+import io
+import logging
+import os
+import subprocess
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import fitz
+from django.conf import settings
+from django.template.loader import get_template
+from PIL import Image as PILImage, ImageOps
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
+
+from pdfmaker.common.stages import stage
+
+from .artifacts import pdf_user_fields, signature_for_render
+
+logger = logging.getLogger(__name__)
+
+
+def get_output_profile(name: str | None = None) -> dict:
+    """
+    Returns the options of an output profile, ``PDF_OUTPUT_PROFILE`` by default.
+    """
+    return settings.PDF_OUTPUT_PROFILES[name or settings.PDF_OUTPUT_PROFILE]
+
+
+def _prepare_image(image, profile: dict):
+    # Stored signatures are embedded as they are, reportlab copies JPEGs
+    # without decoding them
+    if profile["image_quality"] is None and profile["image_max_size"] is None and not profile["grayscale"]:
+        return image
+    img = ImageOps.exif_transpose(PILImage.open(image))
+    if profile["image_max_size"] is not None:
+        img.thumbnail(profile["image_max_size"])
+    if img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        flattened = PILImage.new("RGB", img.size, "white")
+        flattened.paste(img, mask=img.getchannel("A"))
+        img = flattened
+    img = img.convert("L" if profile["grayscale"] else "RGB")
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=profile["image_quality"] or 95, optimize=True)
+    buffer.seek(0)
+    return buffer
+
+
+def _optimize(content: bytes) -> bytes:
+    with fitz.open(stream=content, filetype="pdf") as doc:
+        return doc.tobytes(garbage=3, deflate=True, clean=True, use_objstms=1)
+
+
+_qpdf_missing = False
+
+
+def _linearize(content: bytes) -> bytes:
+    # MuPDF dropped linearisation, so it is left to qpdf
+    global _qpdf_missing
+    if _qpdf_missing:
+        return content
+    with tempfile.TemporaryDirectory() as directory:
+        source, target = os.path.join(directory, "in.pdf"), os.path.join(directory, "out.pdf")
+        with open(source, "wb") as f:
+            f.write(content)
+        try:
+            result = subprocess.run([settings.QPDF_CMD, "--linearize", source, target], capture_output=True)
+        except FileNotFoundError:
+            _qpdf_missing = True
+            logger.warning(f'qpdf not found at {settings.QPDF_CMD}, PDFs are not linearized')
+            return content
+        # Exit code 3 means the output was written with warnings
+        if result.returncode not in (0, 3):
+            raise RuntimeError(f'qpdf failed: {result.stderr.decode(errors="replace")}')
+        with open(target, "rb") as f:
+            return f.read()
+
+
+def _signature_data_uri(image) -> str:
+    content = image.read()
+    image_format = PILImage.open(io.BytesIO(content)).format or "JPEG"
+    return f"data:image/{image_format.lower()};base64,{base64.b64encode(content).decode()}"
+
+
+class PdfEngine(ABC):
+    """
+    Base of the engines rendering user PDFs.
+
+    Engines keep whatever is expensive to set up (fonts, compiled templates)
+    for the lifetime of the process: a single instance of each engine is
+    built per process, ideally when the Celery worker process starts, and
+    reused by every render of that process. Subclasses set ``name`` and
+    implement ``setup`` and ``build``; the output profile is applied here.
+    """
+
+    name = None
+
+    def __init__(self):
+        started = time.perf_counter()
+        self.setup()
+        self.init_seconds = time.perf_counter() - started
+        self.prewarmed = False
+        self.first_render_seconds = None
+        self.warm_renders = 0
+        self.warm_render_seconds = 0.0
+
+    def setup(self):
+        pass
+
+    @abstractmethod
+    def build(self, *, user, signature_image, keywords: str, options: dict, template: dict) -> bytes:
+        """
+        Lays out the PDF of a user and returns its content, before the
+        output profile is applied.
+        """
+
+    def render(self, *, user, signature_image=None, keywords: str = "", profile: str | None = None,
+               template: dict | None = None) -> bytes:
+        """
+        Renders the profile PDF of a user in memory.
+
+        Nothing is written to disk here, so a partially rendered document can
+        never be seen by readers; publishing the bytes is up to the caller.
+
+        Args:
+            user (BaseUser): The user whose profile is rendered.
+            signature_image: Optional file-like object holding the signature
+                image, used instead of reading ``user.signature`` from the storage.
+            keywords (str): Stored in the keywords of the document metadata.
+            profile (str | None): The output profile, see ``PDF_OUTPUT_PROFILES``.
+                Defaults to ``PDF_OUTPUT_PROFILE``.
+            template (dict | None): The options of the PDF template, see
+                ``PDF_TEMPLATES``. Defaults to ``PDF_DEFAULT_TEMPLATE``.
+
+        Returns:
+            bytes: The content of the rendered PDF.
+        """
+        started = time.perf_counter()
+        options = get_output_profile(profile)
+
+        with stage("image_decode"):
+            if user.signature:
+                if signature_image is None:
+                    with signature_for_render(user).open('rb') as signature_file:
+                        signature_image = io.BytesIO(signature_file.read())
+                signature_image = _prepare_image(signature_image, options)
+            else:
+                signature_image = None
+
+        with stage("layout"):
+            content = self.build(
+                user=user,
+                signature_image=signature_image,
+                keywords=keywords,
+                options=options,
+                template=template or get_pdf_template(),
+            )
+        with stage("optimize"):
+            if options["optimize"]:
+                content = _optimize(content)
+            if options["linearize"]:
+                content = _linearize(content)
+
+        self._record(time.perf_counter() - started)
+        return content
+
+    def _record(self, seconds: float):
+        if self.first_render_seconds is None:
+            # When the engine was built lazily, the first render also paid for building it
+            self.first_render_seconds = seconds if self.prewarmed else seconds + self.init_seconds
+            return
+        self.warm_renders += 1
+        self.warm_render_seconds += seconds
+
+    def stats(self) -> dict:
+        """
+        Returns the render timings of this process, contrasting the first
+        (cold) render with the average of the following (warm) ones.
+        """
+        warm_avg = self.warm_render_seconds / self.warm_renders if self.warm_renders else None
+        cold_penalty = None
+        if self.first_render_seconds is not None and warm_avg is not None:
+            cold_penalty = self.first_render_seconds - warm_avg
+        return {
+            "engine": self.name,
+            "pid": os.getpid(),
+            "prewarmed": self.prewarmed,
+            "init_seconds": self.init_seconds,
+            "first_render_seconds": self.first_render_seconds,
+            "warm_renders": self.warm_renders,
+            "warm_render_avg_seconds": warm_avg,
+            "cold_penalty_seconds": cold_penalty,
+        }
+
+
+class PdfRenderer(PdfEngine):
+    """
+    Draws the user PDF with reportlab.
+
+    Building the stylesheet, loading the fonts and exercising reportlab once
+    is expensive, so it is done once when the engine is built.
+    """
+
+    name = "reportlab"
+    title_text = "User Profile"
+    field_template = "<b>{label}:</b> {value}"
+
+    def setup(self):
+        for name, path in settings.PDF_RENDERER_FONTS.items():
+            pdfmetrics.registerFont(TTFont(name, path))
+
+        self.styles = getSampleStyleSheet()
+        self.title_style = self.styles['Title']
+        self.normal_style = self.styles['Normal']
+
+        # Loading the font metrics is deferred by reportlab until a font is
+        # first used, so do it now for every font the styles refer to
+        for style in (self.title_style, self.normal_style):
+            pdfmetrics.getFont(style.fontName)
+        pdfmetrics.getFont(settings.PDF_RENDERER_BOLD_FONT)
+
+        self._warm_up()
+
+    def _warm_up(self):
+        doc = SimpleDocTemplate(io.BytesIO(), pagesize=letter)
+        doc.build([Paragraph(self.title_text, self.title_style), self._field("Warm up", "warm up")])
+
+    def _field(self, label: str, value: str) -> Paragraph:
+        return Paragraph(self.field_template.format(label=label, value=value), self.normal_style)
+
+    def build(self, *, user, signature_image, keywords: str, options: dict, template: dict) -> bytes:
+        # Create a document template and a story
+        buffer = io.BytesIO()
+        doc = SimpleDocTemplate(
+            buffer,
+            pagesize=letter,
+            keywords=keywords,
+            pageCompression=int(options["page_compression"]),
+        )
+        story = []
+
+        # Title
+        story.append(Paragraph(self.title_text, self.title_style))
+        story.append(Spacer(1, 0.5 * inch))
+
+        # Heliacal Date
+        heliacal_date = datetime.now().strftime("%B %d, %Y")
+        story.append(self._field(" Date", heliacal_date))
+        story.append(Spacer(1, 0.2 * inch))
+
+        # Username
+        story.append(self._field("Username", user.name))
+        story.append(Spacer(1, 0.2 * inch))
+
+        # Email
+        story.append(self._field("Email", user.email))
+        story.append(Spacer(1, 0.2 * inch))
+
+        # Profile Image
+        if signature_image is not None:
+            img = Image(signature_image, width=2 * inch, height=2 * inch)
+            img.hAlign = 'LEFT'
+            story.append(img)
+            story.append(Spacer(1, 0.2 * inch))
+        # Build the PDF
+        doc.build(story)
+        return buffer.getvalue()
+
+
+class HtmlPdfRenderer(PdfEngine):
+    """
+    Renders a Django template to HTML and converts it with wkhtmltopdf.
+
+    The layout lives in the template, so it can be changed without touching
+    the code. Templates are compiled once per process and kept in memory,
+    while every render spawns a wkhtmltopdf process (``WKHTMLTOPDF_CMD``).
+    """
+
+    name = "html"
+
+    def setup(self):
+        self.templates = {}
+        for options in settings.PDF_TEMPLATES.values():
+            if options["engine"] == self.name:
+                self._get_template(options["template"])
+
+    def _get_template(self, name: str):
+        template = self.templates.get(name)
+        if template is None:
+            template = self.templates[name] = get_template(name)
+        return template
+
+    def build(self, *, user, signature_image, keywords: str, options: dict, template: dict) -> bytes:
+        html = self._get_template(template["template"]).render({
+            # Only fields covered by the digest, or cached PDFs would go stale
+            "user": pdf_user_fields(user),
+            "date": datetime.now().strftime("%B %d, %Y"),
+            "signature_src": _signature_data_uri(signature_image) if signature_image is not None else "",
+        })
+        command = [settings.WKHTMLTOPDF_CMD, "--quiet", "--encoding", "utf-8"]
+        if not options["page_compression"]:
+            command.append("--no-pdf-compression")
+        try:
+            result = subprocess.run(
+                [*command, "-", "-"],
+                input=html.encode(),
+                capture_output=True,
+                timeout=settings.PDF_HTML_RENDER_TIMEOUT,
+            )
+        except FileNotFoundError:
+            raise RuntimeError(f'wkhtmltopdf not found at {settings.WKHTMLTOPDF_CMD}')
+        if result.returncode != 0 or not result.stdout:
+            raise RuntimeError(f'wkhtmltopdf failed: {result.stderr.decode(errors="replace")}')
+
+        # wkhtmltopdf has no option for the keywords of the document
+        with fitz.open(stream=result.stdout, filetype="pdf") as doc:
+            doc.set_metadata({**doc.metadata, "keywords": keywords})
+            return doc.tobytes(deflate=options["page_compression"])
+
+
+# Render engines by the name PDF_TEMPLATES refers to them with
+PDF_ENGINES = {engine.name: engine for engine in (PdfRenderer, HtmlPdfRenderer)}
+
+_renderers: dict[str, PdfEngine] = {}
+
+
+def get_pdf_template(name: str | None = None) -> dict:
+    """
+    Returns the options of a PDF template, ``PDF_DEFAULT_TEMPLATE`` by default.
+    """
+    return settings.PDF_TEMPLATES[name or settings.PDF_DEFAULT_TEMPLATE]
+
+
+def init_renderer() -> dict[str, PdfEngine]:
+    """
+    Builds the engines of every PDF template in the current process ahead
+    of the first render.
+
+    Meant to be called from the ``worker_process_init`` signal, so the first
+    task of a fresh worker process does not pay for it.
+    """
+    for name in {options["engine"] for options in settings.PDF_TEMPLATES.values()}:
+        renderer = _renderers[name] = PDF_ENGINES[name]()
+        renderer.prewarmed = True
+        logger.info(f'PDF engine {name} warmed up in {renderer.init_seconds:.3f}s (pid {os.getpid()})')
+    return _renderers
+
+
+def get_renderer(engine: str = PdfRenderer.name) -> PdfEngine:
+    """
+    Returns the given engine of the current process, building it on first use.
+    """
+    if engine not in _renderers:
+        _renderers[engine] = PDF_ENGINES[engine]()
+    return _renderers[engine]
+
+
+def render_pdf(*, user, template: str | None = None, **kwargs) -> bytes:
+    """
+    Renders the PDF of a user with the engine of the given PDF template.
+
+    Args:
+        user (BaseUser): The user whose profile is rendered.
+        template (str | None): The name of the template, see ``PDF_TEMPLATES``.
+            Defaults to ``PDF_DEFAULT_TEMPLATE``.
+        **kwargs: Passed on to ``PdfEngine.render``.
+
+    Returns:
+        bytes: The content of the rendered PDF.
+    """
+    options = get_pdf_template(template)
+    return get_renderer(options["engine"]).render(user=user, template=options, **kwargs)
+
+
+def renderer_stats() -> dict | None:
+    """
+    Returns the stats of the engines built in the current process, by engine name.
+    """
+    if not _renderers:
+        return None
+    return {name: renderer.stats() for name, renderer in _renderers.items()}
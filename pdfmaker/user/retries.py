@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.conf import settings
+
+from pdfmaker.common.redis_client import get_redis_client, redis_script
+
+# Counts the failure and opens the breaker once there are too many of them,
+# in a single round trip.
+_record_failure = redis_script("""
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+if failures >= tonumber(ARGV[2]) then
+    redis.call('HSET', KEYS[1], 'open_until', tonumber(ARGV[1]) + tonumber(ARGV[3]))
+end
+redis.call('EXPIRE', KEYS[1], 2 * tonumber(ARGV[3]))
+return {failures, redis.call('HGET', KEYS[1], 'open_until') or '0'}
+""")
+
+
+def pdf_retry_countdown(attempt: int) -> float:
+    """
+    Returns how long to wait before the given retry of a PDF render.
+
+    Uses exponential backoff with full jitter, so retries of many users
+    failing at the same time spread out instead of hitting the workers together.
+
+    Args:
+        attempt (int): The number of attempts that already failed.
+
+    Returns:
+        float: The countdown in seconds.
+    """
+    ceiling = min(settings.PDF_RETRY_BACKOFF_MAX, settings.PDF_RETRY_BACKOFF_BASE * 2 ** attempt)
+    return random.uniform(0, ceiling)
+
+
+def pdf_breaker_key(user_id: int) -> str:
+    return f"pdf_breaker_{user_id}"
+
+
+def pdf_breaker_open(user_id: int) -> bool:
+    """
+    Whether the PDF renders of a user are currently refused.
+    """
+    open_until = get_redis_client().hget(pdf_breaker_key(user_id), "open_until")
+    return float(open_until or 0) > time.time()
+
+
+def record_pdf_failure(user_id: int) -> dict:
+    """
+    Records a failed PDF render of a user.
+
+    After ``PDF_RETRY_MAX_ATTEMPTS`` consecutive failures the breaker opens
+    for ``PDF_BREAKER_COOLDOWN`` seconds. Once that has passed a single
+    render is let through again, and the breaker opens right away if it
+    fails too.
+
+    Returns:
+        dict: The updated retry state.
+    """
+    failures, open_until = _record_failure(
+        keys=[pdf_breaker_key(user_id)],
+        args=[int(time.time()), settings.PDF_RETRY_MAX_ATTEMPTS, settings.PDF_BREAKER_COOLDOWN],
+    )
+    return {"failures": int(failures), "open_until": float(open_until)}
+
+
+def reset_pdf_breaker(user_id: int):
+    """
+    Forgets the failures of a user, e.g. after a successful render or a new signature.
+    """
+    get_redis_client().delete(pdf_breaker_key(user_id))
@@ -1,5 +1,88 @@
-from .models import Profile, BaseUser
+from django.conf import settings
+from django.db.models import QuerySet
 
+from pdfmaker.common.redis_client import get_redis_client
+from pdfmaker.common.storages import get_pdf_storage
+from pdfmaker.common.tiered_cache import tiered_cache
 
-def get_profile(user: BaseUser) -> Profile:
-    return Profile.objects.get(user=user)
+from .models import Profile, BaseUser, PdfJob
+from .artifacts import pdf_input_digest
+from .layout import pdf_artifact_name
+from .eviction import PDF_EVICTION_STATS_KEY, get_pdf_usage, pdf_artifact_key
+
+# Hash of the hits and misses of the PDF render lease, see services.enqueue_user_pdf
+PDF_LEASE_STATS_KEY = "pdf_lease_stats"
+
+
+def get_profile(user_id: int) -> Profile:
+    """
+    Returns the profile of an active user.
+    """
+    return Profile.objects.get(user_id=user_id, user__is_active=True)
+
+
+def get_pdf_artifact(user: BaseUser, template: str | None = None) -> str | None:
+    """
+    Returns the storage name of the PDF already rendered for the user's
+    current inputs with the given template, or None when it still has to
+    be generated.
+
+    Lookups are cached, so concurrent requests do not all ask the storage,
+    see ``TieredCache.get_or_compute``. A missing artifact is remembered
+    for ``PDF_ARTIFACT_MISS_CACHE_TTL`` only, and until it is stored.
+    """
+    pdf_name = pdf_artifact_name(user.id, pdf_input_digest(user, template))
+    found = tiered_cache.get_or_compute(
+        pdf_artifact_key(pdf_name),
+        lambda: pdf_name if get_pdf_storage().exists(pdf_name) else "",
+        settings.PDF_ARTIFACT_CACHE_TTL,
+        name="pdf_artifact",
+        miss_timeout=settings.PDF_ARTIFACT_MISS_CACHE_TTL,
+    )
+    return found or None
+
+
+def get_pdf_lease_stats() -> dict:
+    """
+    Returns how many PDF requests attached to an in-flight render (hits)
+    and how many had to start a new one (misses).
+    """
+    stats = get_redis_client().hgetall(PDF_LEASE_STATS_KEY)
+    hits, misses = int(stats.get("hits", 0)), int(stats.get("misses", 0))
+    return {"hits": hits, "misses": misses, "hit_rate": hits / (hits + misses) if hits + misses else None}
+
+
+def get_pdf_eviction_stats() -> dict:
+    """
+    Returns the usage of the PDF storage, how often a requested PDF was
+    still stored (hits) or had to be rendered (misses), and how much the
+    eviction reclaimed so far.
+    """
+    stats = {key: int(value) for key, value in get_redis_client().hgetall(PDF_EVICTION_STATS_KEY).items()}
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    return {
+        "usage": get_pdf_usage(),
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else None,
+        "evicted_files": stats.get("evicted_files", 0),
+        "bytes_reclaimed": stats.get("bytes_reclaimed", 0),
+    }
+
+
+def get_pdf_jobs(*, task_ids: list[str], user: BaseUser | None = None) -> QuerySet[PdfJob]:
+    """
+    Returns the PDF jobs of the given task IDs in a single query.
+
+    Args:
+        task_ids (list[str]): The IDs of the tasks rendering the PDFs.
+        user (BaseUser | None): Only return the jobs of this user, or the
+            jobs of every user when None.
+
+    Returns:
+        QuerySet[PdfJob]: The jobs found, unknown IDs are left out.
+    """
+    jobs = PdfJob.objects.filter(task_id__in=task_ids)
+    if user is not None:
+        jobs = jobs.filter(user=user)
+    return jobs
@@ -1,19 +1,37 @@
 from django.db import transaction
-from django.core.cache import cache
-from .models import BaseUser, Profile
+from django.db.models import F, Q
+from django.db.models.functions import Coalesce, Now
+from .models import BaseUser, Profile, PdfJob
+from .artifacts import (
+    signature_content_hash,
+    signature_for_render,
+    pdf_input_digest,
+    user_pdf_artifacts,
+    publish_pdf,
+    sign_pdf_inputs,
+    load_pdf_manifest,
+    store_pdf_manifest,
+    verify_pdf_artifact,
+)
+from .layout import pdf_artifact_name
+from .eviction import record_pdf_stored, forget_pdf, delete_stored_pdf
+from .renderer import render_pdf
+from .events import publish_pdf_event, pdf_ready_event
+from .selectors import PDF_LEASE_STATS_KEY
+from .retries import pdf_retry_countdown, pdf_breaker_key, record_pdf_failure, reset_pdf_breaker
+from pdfmaker.common.redis_client import get_redis_client, redis_script
+from pdfmaker.common.storages import get_pdf_storage
+from pdfmaker.common.stages import stage
+from pdfmaker.common.tiered_cache import tiered_cache
 from config.django import base as settings
-import os
+import io
+import time
+import uuid
 import logging
+from itertools import islice
 from celery import shared_task
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import inch
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image
-from datetime import datetime
-import redis
-import json
-import fitz
-import re
+from django.core.files.base import ContentFile
+from PIL import Image as PILImage, ImageOps
 
 # Configure the logger
 logger = logging.getLogger(__name__)
@@ -68,178 +86,490 @@ def register(*, name: str, bio: str | None, email: str, password: str) -> BaseUs
     return user
 
 
-def profile_count_update():
+def update_or_add_signature(signature, user: BaseUser):
     """
-    Updates the profile count information in the database based on cached data.
+    Updates or adds a signature for the specified user.
+
+    The render-ready variant of the signature is built off the request path
+    by ``normalize_user_signature``; a PDF requested before that builds it
+    first, see ``build_user_pdf``. Uploading the same image bytes again is a no-op, so the PDF already
+    rendered for the user stays valid.
 
-    This function iterates over all cached profile data and updates the
-    `posts_count`, `subscribers_count`, and `subscriptions_count` for each profile.
+    Args:
+        signature: The uploaded signature image.
+        user (BaseUser): The user for whom the signature is being updated.
     """
-    profiles = cache.keys("profile_*")
+    us = BaseUser.objects.filter(id=user.id).first()
 
-    for profile_key in profiles:  # e.g., profile_amirbahador.pv@gmail.com
-        email = profile_key.replace("profile_", "")
-        data = cache.get(profile_key)
+    signature_hash = signature_content_hash(signature)
+    if us.signature and us.signature_hash == signature_hash:
+        return
 
-        try:
-            profile = Profile.objects.get(user__email=email)
-            profile.posts_count = data.get("posts_count")
-            profile.subscribers_count = data.get("subscribers_count")
-            profile.subscriptions_count = data.get("subscriptions_count")
-            profile.save()
+    if us.signature_rendered:
+        us.signature_rendered.delete(save=False)
+    us.signature = signature
+    us.signature_hash = signature_hash
+    us.save()
+    delete_pdf(us)
 
-        except Exception as ex:
-            logger.error(f"Error updating profile for {email}: {ex}")
+    transaction.on_commit(lambda: normalize_user_signature.delay(us.id))
+
+
+def _normalize_signature_image(signature_file) -> bytes:
+    image = ImageOps.exif_transpose(PILImage.open(signature_file))
+    image.thumbnail(settings.SIGNATURE_RENDER_SIZE)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        flattened = PILImage.new("RGB", image.size, "white")
+        flattened.paste(image, mask=image.getchannel("A"))
+        image = flattened
+    else:
+        image = image.convert("RGB")
 
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=settings.SIGNATURE_RENDER_QUALITY, optimize=True)
+    return buffer.getvalue()
 
-def update_or_add_signature(signature: str, user: BaseUser):
+
+def normalize_signature(user: BaseUser) -> str:
     """
-    Updates or adds a signature for the specified user.
+    Builds and stores the render-ready variant of a user's signature.
+
+    The image is downscaled to fit ``SIGNATURE_RENDER_SIZE``, flattened onto
+    a white background and stored as a compressed JPEG, which reportlab
+    embeds as-is without decoding it again on every render.
 
     Args:
-        signature (str): The path to the signature image.
-        user (BaseUser): The user for whom the signature is being updated.
+        user (BaseUser): The user whose signature is normalised.
+
+    Returns:
+        str: The storage name of the variant.
     """
-    us = BaseUser.objects.filter(id=user.id).first()
+    with user.signature.open('rb') as signature_file:
+        content = _normalize_signature_image(signature_file)
 
-    us.signature = signature
-    us.save()
-    delete_pdf(us)
+    rendered_name = user.signature_rendered.field.generate_filename(user, f"{user.signature_hash[:16]}.jpg")
+    return user.signature_rendered.storage.save(rendered_name, ContentFile(content))
 
 
-def delete_pdf(user):
-    pdf_dir = os.path.join(settings.MEDIA_ROOT, "pdfs")
-    pdf_path = os.path.join(pdf_dir, f'user_{user.id}.pdf')
-    if os.path.exists(pdf_path):
-        os.remove(pdf_path)
-    redis_client = redis.StrictRedis.from_url(settings.REDIS_URL, decode_responses=True)
-    redis_client.delete(f"disabled_user{user.id}_task")
+def ensure_signature_rendered(user: BaseUser) -> bool:
+    """
+    Builds the render-ready variant of a user's signature when it is missing:
+    right after an upload, or for a signature uploaded before variants
+    existed, see the ``normalize_signatures`` command.
 
+    Args:
+        user (BaseUser): The user whose signature is normalised.
+
+    Returns:
+        bool: Whether a variant was built.
+    """
+    if not user.signature or user.signature_rendered:
+        return False
+
+    rendered_name = normalize_signature(user)
+    # The signature may have been replaced meanwhile
+    updated = (
+        BaseUser.objects.filter(id=user.id, signature_hash=user.signature_hash)
+        .filter(Q(signature_rendered="") | Q(signature_rendered__isnull=True))
+        .update(signature_rendered=rendered_name)
+    )
+    if not updated:
+        user.signature_rendered.storage.delete(rendered_name)
+        user.refresh_from_db(fields=["signature", "signature_hash", "signature_rendered"])
+        return False
+
+    user.signature_rendered = rendered_name
+    logger.info(f'Signature of user {user.id} normalised to {rendered_name}')
+    return True
 
 
 @shared_task
-def generate_user_pdf(user_id: int) -> str:
+def normalize_user_signature(user_id: int):
+    """
+    Builds the render-ready variant of a user's new signature, scheduled by
+    ``update_or_add_signature`` once the upload is committed.
+
+    Args:
+        user_id (int): The ID of the user whose signature is normalised.
+    """
+    user = BaseUser.objects.filter(id=user_id).first()
+    if user is not None:
+        ensure_signature_rendered(user)
+
+
+def delete_pdf(user: BaseUser):
+    """
+    Removes the stored PDFs of a user that no longer match the user's inputs.
+
+    The artifacts rendered for the current inputs digest of every PDF
+    template are kept, so they can still be served without regenerating them.
+    """
+    current_names = {
+        pdf_artifact_name(user.id, pdf_input_digest(user, template)) for template in settings.PDF_TEMPLATES
+    }
+    for pdf_name in user_pdf_artifacts(user.id):
+        if pdf_name not in current_names:
+            delete_stored_pdf(pdf_name)
+            forget_pdf(pdf_name)
+    # The inputs changed, so past failures say nothing about the next render
+    reset_pdf_breaker(user.id)
+
+
+def build_user_pdf(
+    *, user: BaseUser, signature_images: dict | None = None, template: str | None = None
+) -> tuple[str, bool]:
+    """
+    Makes sure the PDF for the user's current inputs exists, rendering it if needed.
+
+    Args:
+        user (BaseUser): The user the PDF is built for.
+        signature_images (dict | None): Optional map of signature file name to
+            image bytes, shared between renders so each image is read only once.
+        template (str | None): The PDF template, see ``PDF_TEMPLATES``.
+            Defaults to ``PDF_DEFAULT_TEMPLATE``.
+
+    Returns:
+        tuple[str, bool]: The storage name of the PDF and whether it had to be rendered.
+    """
+    # The artifact is keyed by the digest of its inputs, so an existing
+    # file is already up to date and does not need to be rendered again,
+    # as long as its manifest is still around to vouch for it
+    digest = pdf_input_digest(user, template)
+    pdf_name = pdf_artifact_name(user.id, digest)
+    if load_pdf_manifest(digest) is not None and get_pdf_storage().exists(pdf_name):
+        return pdf_name, False
+
+    ensure_signature_rendered(user)
+    signature_image = None
+    if user.signature and signature_images is not None:
+        signature = signature_for_render(user)
+        if signature.name not in signature_images:
+            with signature.open('rb') as signature_file:
+                signature_images[signature.name] = signature_file.read()
+        signature_image = io.BytesIO(signature_images[signature.name])
+
+    content = render_pdf(
+        user=user,
+        template=template,
+        signature_image=signature_image,
+        keywords=sign_pdf_inputs(user, digest),
+    )
+    with stage("write"):
+        # The manifest goes first, so a published file always has one
+        store_pdf_manifest(user=user, digest=digest, content=content)
+        publish_pdf(pdf_name, content)
+        record_pdf_stored(pdf_name, len(content))
+    return pdf_name, True
+
+
+# Takes the lease, or returns the task already holding it, and counts the
+# hit or miss, in a single round trip
+_acquire_pdf_lease = redis_script("""
+if redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2]) then
+    redis.call('HINCRBY', KEYS[2], 'misses', 1)
+    return ARGV[1]
+end
+redis.call('HINCRBY', KEYS[2], 'hits', 1)
+return redis.call('GET', KEYS[1])
+""")
+
+# Deletes the lease only if it is still held by the given task
+_release_pdf_lease = redis_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+
+def pdf_lease_key(user_id: int, template: str | None = None) -> str:
+    return f"pdf_lease_{user_id}_{template or settings.PDF_DEFAULT_TEMPLATE}"
+
+
+def enqueue_user_pdf(
+    user: BaseUser, countdown: float = 0, priority: int | None = None, template: str | None = None
+) -> str:
+    """
+    Starts generating the user's PDF, unless a render is already in flight.
+
+    A lease holding the ID of the in-flight task is taken per user and
+    template with an atomic SET NX, so concurrent callers (double clicks,
+    several tabs) attach to the same task instead of enqueueing identical
+    renders. The lease is released when the task finishes, or expires after
+    ``PDF_RENDER_LEASE_TTL``.
+
+    Args:
+        user (BaseUser): The user whose PDF is generated.
+        countdown (float): How many seconds to wait before rendering.
+        priority (int | None): The priority of the render on the interactive
+            queue, ``PDF_RENDER_PRIORITY`` by default.
+        template (str | None): The PDF template, see ``PDF_TEMPLATES``.
+            Defaults to ``PDF_DEFAULT_TEMPLATE``.
+
+    Returns:
+        str: The ID of the task rendering the PDF.
+    """
+    template = template or settings.PDF_DEFAULT_TEMPLATE
+    task_id = str(uuid.uuid4())
+    lease_ms = int((settings.PDF_RENDER_LEASE_TTL + countdown) * 1000)
+    in_flight_task_id = _acquire_pdf_lease(
+        keys=[pdf_lease_key(user.id, template), PDF_LEASE_STATS_KEY], args=[task_id, lease_ms],
+    )
+    if in_flight_task_id != task_id:
+        tiered_cache.count("pdf_render", "coalesced")
+        return in_flight_task_id
+    tiered_cache.count("pdf_render", "miss")
+
+    def send_task():
+        try:
+            generate_user_pdf.apply_async(
+                args=(user.id, template),
+                task_id=task_id,
+                countdown=countdown,
+                priority=settings.PDF_RENDER_PRIORITY if priority is None else priority,
+            )
+        except Exception:
+            release_pdf_lease(user.id, task_id, template)
+            update_pdf_job(task_id, state=PdfJob.State.FAILURE, finished_at=Now())
+            raise
+
+    try:
+        PdfJob.objects.create(
+            task_id=task_id, user=user, template=template, input_digest=pdf_input_digest(user, template),
+        )
+        # The worker must find the job row, so the task is only sent once it is committed
+        transaction.on_commit(send_task)
+    except Exception:
+        release_pdf_lease(user.id, task_id, template)
+        raise
+    return task_id
+
+
+def release_pdf_lease(user_id: int, task_id: str, template: str | None = None):
+    """
+    Releases the render lease of a user if it is still held by the given task.
+    """
+    _release_pdf_lease(keys=[pdf_lease_key(user_id, template)], args=[task_id])
+
+
+def update_pdf_job(task_id: str, **fields) -> int:
+    """
+    Updates the persisted state of a PDF job with a single UPDATE query.
+
+    Args:
+        task_id (str): The ID of the task rendering the PDF.
+        **fields: The fields of the job to update.
+
+    Returns:
+        int: The number of updated jobs, 0 when the job is unknown.
+    """
+    return PdfJob.objects.filter(task_id=task_id).update(**fields)
+
+
+@shared_task(bind=True)
+def generate_user_pdf(self, user_id: int, template: str | None = None) -> str:
     """
     Generates a PDF document containing the user's profile information.
 
     Args:
         user_id (int): The ID of the user for whom the PDF is being generated.
+        template (str | None): The PDF template, see ``PDF_TEMPLATES``.
+            Defaults to ``PDF_DEFAULT_TEMPLATE``.
 
     Returns:
-        str: The relative path to the generated PDF.
+        str: The storage name of the generated PDF.
 
     Raises:
-        Exception: If there is an error during the PDF generation process.
+        Exception: If there is an error during the PDF generation process
+            and the render cannot be retried anymore.
     """
+    task_id = self.request.id
+    update_pdf_job(task_id, state=PdfJob.State.STARTED, attempts=F('attempts') + 1,
+                   started_at=Coalesce('started_at', Now()))
     try:
-        user = BaseUser.objects.get(id=user_id)
-
-        # Define the path to save the generated PDF
-        pdf_dir = os.path.join(settings.MEDIA_ROOT, "pdfs")
-        pdf_path = os.path.join(pdf_dir, f'user_{user.id}.pdf')
-        # Create a document template and a story
-        doc = SimpleDocTemplate(pdf_path, pagesize=letter)
-        story = []
-
-        # Get styles
-        styles = getSampleStyleSheet()
-        title_style = styles['Title']
-        normal_style = styles['Normal']
-
-        # Title
-        title = Paragraph("User Profile", title_style)
-        story.append(title)
-        story.append(Spacer(1, 0.5 * inch))
-
-        # Get the current date
-        heliacal_date = datetime.now().strftime("%B %d, %Y")
-
-        # Heliacal Date
-        heliacal_date_text = f"<b> Date:</b> {heliacal_date}"
-        heliacal_date_paragraph = Paragraph(heliacal_date_text, normal_style)
-        story.append(heliacal_date_paragraph)
-        story.append(Spacer(1, 0.2 * inch))
-
-        # Username
-        username_text = f"<b>Username:</b> {user.name}"
-        username = Paragraph(username_text, normal_style)
-        story.append(username)
-        story.append(Spacer(1, 0.2 * inch))
-
-        # Email
-        email_text = f"<b>Email:</b> {user.email}"
-        email = Paragraph(email_text, normal_style)
-        story.append(email)
-        story.append(Spacer(1, 0.2 * inch))
-
-        # Profile Image
-        if user.signature:
-            signature_path = user.signature.path
-            img = Image(signature_path, width=2 * inch, height=2 * inch)
-            img.hAlign = 'LEFT'
-            story.append(img)
-            story.append(Spacer(1, 0.2 * inch))
-        # Build the PDF
-        doc.build(story)
-
-        logger.info(f'PDF generated at: {pdf_path}')
-        # Return the relative path to the PDF
-        return f"{pdf_path}"
+        with stage("db_fetch"):
+            user = BaseUser.objects.get(id=user_id)
+        pdf_name, rendered = build_user_pdf(user=user, template=template)
     except Exception as e:
         logger.error(f'Error generating PDF for user {user_id}: {str(e)}')
-        raise
+        if isinstance(e, BaseUser.DoesNotExist):
+            release_pdf_lease(user_id, task_id, template)
+            update_pdf_job(task_id, state=PdfJob.State.FAILURE, finished_at=Now())
+            raise
+        breaker = record_pdf_failure(user_id)
+        if breaker["open_until"] > time.time() or self.request.retries >= settings.PDF_RETRY_MAX_ATTEMPTS:
+            release_pdf_lease(user_id, task_id, template)
+            update_pdf_job(task_id, state=PdfJob.State.FAILURE, finished_at=Now())
+            publish_pdf_event(user_id, {"status": "FAILURE", "task_id": task_id})
+            raise
+        # The retry keeps the task ID, so it also keeps the lease until it runs
+        countdown = pdf_retry_countdown(self.request.retries)
+        get_redis_client().expire(pdf_lease_key(user_id, template), int(settings.PDF_RENDER_LEASE_TTL + countdown))
+        update_pdf_job(task_id, state=PdfJob.State.RETRY)
+        raise self.retry(
+            exc=e,
+            countdown=countdown,
+            max_retries=settings.PDF_RETRY_MAX_ATTEMPTS,
+            priority=settings.PDF_RETRY_PRIORITY,
+        )
+
+    manifest = load_pdf_manifest(pdf_input_digest(user, template)) or {}
+    update_pdf_job(
+        task_id,
+        state=PdfJob.State.SUCCESS,
+        artifact=pdf_name,
+        output_sha256=manifest.get("output_sha256", ""),
+        finished_at=Now(),
+    )
+    reset_pdf_breaker(user_id)
+    release_pdf_lease(user_id, task_id, template)
+    publish_pdf_event(user_id, pdf_ready_event(task_id=task_id, pdf_name=pdf_name))
+    if rendered:
+        logger.info(f'PDF generated at: {pdf_name}')
+    else:
+        logger.info(f'PDF for user {user_id} served from cache: {pdf_name}')
+    return pdf_name
+
+
+def schedule_pdf_retry(user: BaseUser, failed_task_id: str, template: str | None = None) -> str | None:
+    """
+    Schedules a new render of a user's PDF after a failed one.
+
+    The render is enqueued with exponential backoff through the per-user
+    lease, and each failed task is retried at most once however often its
+    status is polled. Nothing is scheduled while the user's circuit
+    breaker is open.
+
+    Args:
+        user (BaseUser): The user whose PDF failed.
+        failed_task_id (str): The ID of the task that failed.
+        template (str | None): The PDF template the failed task rendered.
+
+    Returns:
+        str | None: The ID of the retry task, or None when the breaker is open.
+    """
+    redis_client = get_redis_client()
+    retry_key = f"pdf_retry_{failed_task_id}"
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.hget(pdf_breaker_key(user.id), "open_until")
+    pipe.get(retry_key)
+    open_until, retry_task_id = pipe.execute()
+    if float(open_until or 0) > time.time():
+        return None
+    if retry_task_id is not None:
+        return retry_task_id
+
+    breaker = record_pdf_failure(user.id)
+    if breaker["open_until"] > time.time():
+        return None
+
+    # Drop the broken artifact, otherwise the retry would serve it from cache
+    pdf_name = pdf_artifact_name(user.id, pdf_input_digest(user, template))
+    delete_stored_pdf(pdf_name)
+    forget_pdf(pdf_name)
+
+    retry_task_id = enqueue_user_pdf(
+        user,
+        countdown=pdf_retry_countdown(breaker["failures"]),
+        priority=settings.PDF_RETRY_PRIORITY,
+        template=template,
+    )
+    redis_client.set(retry_key, retry_task_id, ex=settings.PDF_BREAKER_COOLDOWN)
+    return retry_task_id
+
+
+def _chunked(iterable, size: int):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+@shared_task(bind=True)
+def generate_users_pdf_bulk(
+    self, user_ids: list[int] | None = None, chunk_size: int = 500, template: str | None = None
+) -> dict:
+    """
+    Generates the PDFs of many users inside a single task invocation.
+
+    Users are loaded one chunk at a time with ``in_bulk``, while the process
+    renderer and the signature images are shared by every render of the run.
+    Progress is published as a ``PROGRESS`` state after each chunk.
+
+    Args:
+        user_ids (list[int] | None): The users to render, or None for every user.
+        chunk_size (int): How many users are loaded and rendered per chunk.
+        template (str | None): The PDF template, see ``PDF_TEMPLATES``.
+            Defaults to ``PDF_DEFAULT_TEMPLATE``.
+
+    Returns:
+        dict: Counters of the run and the IDs of the users that failed.
+    """
+    if user_ids is None:
+        total = BaseUser.objects.count()
+        user_ids = BaseUser.objects.order_by('id').values_list('id', flat=True).iterator(chunk_size=chunk_size)
+    else:
+        total = len(user_ids)
+
+    progress = {"total": total, "done": 0, "rendered": 0, "cached": 0, "failed": []}
+
+    for chunk in _chunked(user_ids, chunk_size):
+        users = BaseUser.objects.in_bulk(chunk)
+        # Signatures are only shared within a chunk to keep the memory bounded
+        signature_images = {}
+        for user_id in chunk:
+            user = users.get(user_id)
+            if user is None:
+                progress["failed"].append(user_id)
+                continue
+            try:
+                _, rendered = build_user_pdf(user=user, signature_images=signature_images, template=template)
+            except Exception as e:
+                logger.error(f'Error generating PDF for user {user_id}: {str(e)}')
+                progress["failed"].append(user_id)
+                continue
+            progress["rendered" if rendered else "cached"] += 1
+
+        progress["done"] += len(chunk)
+        self.update_state(state="PROGRESS", meta=progress)
+        logger.info(f'Bulk PDF generation progress: {progress["done"]}/{total}')
+
+    return progress
 
 
 def check_task_status(task_id: str, user) -> str:
     """
-    Checks the status of a Celery task and returns the result if successful.
+    Checks the status of a PDF job and returns the result if successful.
+
+    The state is read from the persisted ``PdfJob`` of the task rather than
+    from the raw Celery result.
+
+    When the task failed, or produced a PDF that does not match its manifest,
+    a single retry is scheduled in the background and the call returns
+    right away.
 
     Args:
         task_id (str): The ID of the Celery task.
+        user: The ID of the user the task renders the PDF for.
 
     Returns:
-        str: The path to the generated PDF if the task was successful,
+        str: The storage name of the generated PDF if the task was successful,
              or a message indicating the task's status.
     """
-    redis_client = redis.StrictRedis.from_url(settings.REDIS_URL, decode_responses=True)
-    result = json.loads(redis_client.get(f"celery-task-meta-{task_id}"))
-    if result.get("status") == "SUCCESS":
-        path = result.get("result")
-        pdf_document = fitz.open(path)
-
-        page = pdf_document.load_page(0)
-        pdf_text = page.get_text()
-        username_pattern = re.compile(r'Username:\s*([\w]+)')
-        email_pattern = re.compile(r'Email:\s*([\w\.]+@[\w\.]+)')
-        username_match = username_pattern.search(pdf_text).group(1)
-        email_match = email_pattern.search(pdf_text).group(1)
+    with stage("db_fetch"):
         usr = BaseUser.objects.get(id=user)
-
-        if username_match == usr.name and email_match == usr.email and page.get_images():
-            pdf_path = result.get("result")
-            return f"{pdf_path}"
-        else:
-            redis_client.set(task_id, 0)
-            if not redis_client.exists(f"disabled_user{user}_task"):
-                while int(redis_client.get(task_id)) < 5:
-                    pdf_path = result.get("result")
-                    if os.path.exists(pdf_path):
-                        os.remove(pdf_path)
-                    redis_client.set(task_id, int(redis_client.get(task_id)) + 1)
-                    generate_user_pdf.delay(user)
-                redis_client.set(f"disabled_user{user}_task", "disabled")
-                redis_client.expire(task_id, 360)
-            return "something went wrong update your signature or wait for 60 minutes"
-    else:
-        redis_client.set(task_id, 1)
-        if not redis_client.exists(f"disabled_user{user}_task"):
-            while int(redis_client.get(task_id)) < 5:
-                redis_client.set(task_id, int(redis_client.get(task_id)) + 1)
-                pdf_path = result.get("result")
-                if os.path.exists(pdf_path):
-                    os.remove(pdf_path)
-                generate_user_pdf.delay(user)
-            redis_client.set(f"disabled_user{user}_task", "disabled")
-            redis_client.expire(task_id, 360)
-        message = result.get("status")
-        return f"{message}, update your signature or wait for 60 minutes"
+        job = PdfJob.objects.filter(task_id=task_id, user=usr).only("state", "template").first()
+    template = (job.template or None) if job is not None else None
+    pdf_name = pdf_artifact_name(usr.id, pdf_input_digest(usr, template))
+    with stage("verify"):
+        verified = verify_pdf_artifact(user=usr, pdf_name=pdf_name, template=template)
+    if verified:
+        return pdf_name
+
+    message = job.state if job is not None else PdfJob.State.PENDING
+    if message in ("PENDING", "STARTED", "RETRY"):
+        return f"{message}, your PDF is being generated"
+
+    if schedule_pdf_retry(usr, task_id, template) is None:
+        return "something went wrong update your signature or wait for 60 minutes"
+    return f"{message}, your PDF is being generated again"
@@ -1,11 +1,60 @@
+import logging
+
 from celery import shared_task
-from .services import profile_count_update
+from celery.signals import worker_process_init, worker_process_shutdown
+from .renderer import init_renderer, renderer_stats
+from .eviction import evict_pdfs
+from .selectors import get_pdf_eviction_stats
+from .counters import flush_profile_counters
 
+logger = logging.getLogger(__name__)
+
+
+@worker_process_init.connect
+def warm_up_pdf_renderer(**kwargs):
+    init_renderer()
+
+
+@worker_process_shutdown.connect
+def log_pdf_renderer_stats(**kwargs):
+    stats = renderer_stats()
+    if stats is not None:
+        logger.info(f"PDF renderer stats: {stats}")
 
-@shared_task
-def profile_count_update():
-    profile_count_update()
 
 @shared_task
 def hello2():
     print("HIIIIIII")
+
+
+@shared_task
+def pdf_renderer_stats():
+    """
+    Returns the renderer stats of the worker process that runs this task.
+    """
+    return renderer_stats()
+
+
+@shared_task
+def evict_pdf_artifacts():
+    """
+    Evicts the least recently downloaded PDFs once the storage quotas are
+    exceeded, run periodically by Celery beat. Returns what this run evicted
+    along with the totals of ``selectors.get_pdf_eviction_stats``.
+    """
+    run = evict_pdfs()
+    totals = get_pdf_eviction_stats()
+    logger.info(
+        f"Evicted {run['evicted_files']} PDFs, reclaimed {run['bytes_reclaimed']} bytes; "
+        f"hit rate {totals['hit_rate']}, {totals['bytes_reclaimed']} bytes reclaimed in total"
+    )
+    return {**run, "totals": totals}
+
+
+@shared_task
+def flush_profile_counter_increments(batch_size: int | None = None):
+    """
+    Applies the pending profile counter increments to the database, see
+    ``counters.flush_profile_counters``, and returns the stats of the run.
+    """
+    return flush_profile_counters(batch_size=batch_size)
@@ -0,0 +1,167 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import F
+from django.test import TestCase, override_settings
+
+from pdfmaker.common.redis_client import get_redis_client
+from pdfmaker.user.counters import (
+    PROFILE_COUNTER_CLAIMS_KEY,
+    PROFILE_COUNTERS_DIRTY_KEY,
+    drain_profile_snapshots,
+    flush_profile_counters,
+    get_profile_counters,
+    increment_profile_counter,
+    profile_counters_key,
+)
+from pdfmaker.user.models import Profile
+from pdfmaker.user.services import register
+from pdfmaker.utils.tests import clear_caches, faker
+
+
+class WorkerLost(BaseException):
+    """
+    Stands for the worker process dying in the middle of a flush.
+    """
+
+
+class ProfileCounterTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.redis = get_redis_client()
+        self.users = [
+            register(name=faker.name(), bio=None, email=faker.unique.email(), password=faker.password())
+            for _ in range(3)
+        ]
+
+    def counters(self, user) -> tuple:
+        profile = Profile.objects.get(user=user)
+        return profile.posts_count, profile.subscriber_count, profile.subscription_count
+
+    def test_increments_are_shown_before_they_are_flushed(self):
+        user = self.users[0]
+        Profile.objects.filter(user=user).update(posts_count=4)
+
+        self.assertEqual(increment_profile_counter(user.id, "posts_count", 2), 2)
+        increment_profile_counter(user.id, "subscriber_count")
+
+        self.assertEqual(self.counters(user), (4, 0, 0))
+        self.assertEqual(
+            get_profile_counters(Profile.objects.get(user=user)),
+            {"posts_count": 6, "subscriber_count": 1, "subscription_count": 0},
+        )
+
+    def test_unknown_counter_is_rejected(self):
+        with self.assertRaises(ValueError):
+            increment_profile_counter(self.users[0].id, "bio")
+
+    def test_flush_applies_the_increments_as_deltas(self):
+        for i, user in enumerate(self.users):
+            increment_profile_counter(user.id, "posts_count", i + 1)
+            increment_profile_counter(user.id, "subscription_count", 2)
+        # Written by someone else after the increments, and kept by the flush
+        Profile.objects.filter(user=self.users[0]).update(posts_count=F("posts_count") + 10)
+
+        stats = flush_profile_counters(batch_size=2)
+
+        self.assertEqual((stats["batches"], stats["profiles"], stats["released"]), (2, 3, 0))
+        self.assertEqual([self.counters(user) for user in self.users], [(11, 0, 2), (2, 0, 2), (3, 0, 2)])
+        self.assertEqual(self.redis.scard(PROFILE_COUNTERS_DIRTY_KEY), 0)
+        self.assertEqual(self.redis.zcard(PROFILE_COUNTER_CLAIMS_KEY), 0)
+        self.assertFalse(self.redis.exists(*(profile_counters_key(user.id) for user in self.users)))
+
+    def test_flush_keeps_counters_at_zero_or_above(self):
+        user = self.users[0]
+        Profile.objects.filter(user=user).update(subscriber_count=1)
+        increment_profile_counter(user.id, "subscriber_count", -3)
+
+        flush_profile_counters()
+
+        self.assertEqual(self.counters(user), (0, 0, 0))
+
+    def test_failed_update_gives_the_increments_back(self):
+        user = self.users[0]
+        increment_profile_counter(user.id, "posts_count", 5)
+
+        with mock.patch("pdfmaker.user.counters._apply", side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_profile_counters()
+
+        self.assertEqual(self.redis.hgetall(profile_counters_key(user.id)), {"posts_count": "5"})
+        self.assertEqual(self.redis.smembers(PROFILE_COUNTERS_DIRTY_KEY), {str(user.id)})
+        self.assertEqual(self.redis.zcard(PROFILE_COUNTER_CLAIMS_KEY), 0)
+
+        flush_profile_counters()
+        self.assertEqual(self.counters(user), (5, 0, 0))
+
+    def test_claims_of_a_dead_flush_are_given_back(self):
+        user = self.users[0]
+        increment_profile_counter(user.id, "posts_count", 5)
+        with mock.patch("pdfmaker.user.counters._apply", side_effect=WorkerLost):
+            with self.assertRaises(WorkerLost):
+                flush_profile_counters()
+        increment_profile_counter(user.id, "posts_count", 1)
+
+        # Still within the time limit of the flush that claimed them
+        self.assertEqual(flush_profile_counters()["released"], 0)
+        self.assertEqual(self.counters(user), (1, 0, 0))
+
+        with override_settings(PROFILE_COUNTER_FLUSH_TIME_LIMIT=0):
+            stats = flush_profile_counters()
+
+        self.assertEqual((stats["released"], stats["profiles"]), (1, 1))
+        self.assertEqual(self.counters(user), (6, 0, 0))
+        self.assertEqual(self.redis.zcard(PROFILE_COUNTER_CLAIMS_KEY), 0)
+
+
+class ProfileSnapshotDrainTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        pool = get_redis_client().connection_pool
+        # SCAN needs the Redis cache backend, on the same fake server as the shared client
+        self.settings_override = override_settings(CACHES={
+            "default": {
+                "BACKEND": "django_redis.cache.RedisCache",
+                "LOCATION": "redis://localhost:6379/0",
+                "OPTIONS": {
+                    "CONNECTION_POOL_KWARGS": {
+                        "connection_class": pool.connection_class,
+                        "server": pool.connection_kwargs["server"],
+                    },
+                },
+            },
+        })
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = register(name=faker.name(), bio=None, email=faker.unique.email(), password=faker.password())
+
+    def test_snapshots_become_increments(self):
+        Profile.objects.filter(user=self.user).update(posts_count=3, subscriber_count=7)
+        increment_profile_counter(self.user.id, "posts_count", 2)
+        cache.set(f"profile_{self.user.email}", {"posts_count": 10, "subscribers_count": 7}, None)
+        cache.set("profile_nobody@example.com", {"posts_count": 1}, None)
+        cache.set("profile_response:1", {"value": {}, "version": "1"}, None)
+
+        stats = drain_profile_snapshots(batch_size=2)
+
+        self.assertEqual(
+            {key: stats[key] for key in ("keys", "drained", "unchanged", "missing", "invalid")},
+            {"keys": 3, "drained": 1, "unchanged": 0, "missing": 1, "invalid": 1},
+        )
+        self.assertIsNone(cache.get(f"profile_{self.user.email}"))
+        self.assertIsNone(cache.get("profile_nobody@example.com"))
+        self.assertIsNotNone(cache.get("profile_response:1"))
+
+        flush_profile_counters()
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual((profile.posts_count, profile.subscriber_count), (10, 7))
+
+    def test_dry_run_leaves_the_snapshots(self):
+        cache.set(f"profile_{self.user.email}", {"posts_count": 4}, None)
+
+        stats = drain_profile_snapshots(dry_run=True)
+
+        self.assertEqual(stats["drained"], 1)
+        self.assertEqual(cache.get(f"profile_{self.user.email}"), {"posts_count": 4})
+        self.assertEqual(get_redis_client().hgetall(profile_counters_key(self.user.id)), {})
@@ -0,0 +1,111 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+
+from pdfmaker.common.redis_client import get_redis_client
+from pdfmaker.user.artifacts import pdf_manifest_key
+from pdfmaker.user.eviction import PDF_ACCESS_KEY, evict_pdfs, get_pdf_usage, record_pdf_stored, touch_pdf
+from pdfmaker.user.layout import pdf_artifact_digest, pdf_artifact_name
+from pdfmaker.user.selectors import get_pdf_eviction_stats
+from pdfmaker.utils.tests import clear_caches, faker
+
+HOUR = 60 * 60
+
+
+@override_settings(
+    PDF_STORAGE_QUOTA_BYTES=0,
+    PDF_STORAGE_QUOTA_FILES=0,
+    PDF_EVICTION_TARGET_RATIO=0.5,
+    PDF_EVICTION_MIN_AGE=HOUR,
+    PDF_EVICTION_BATCH_SIZE=2,
+    PDF_ARTIFACT_MAX_IDLE=30 * 24 * HOUR,
+)
+class PdfEvictionTests(SimpleTestCase):
+    def setUp(self):
+        clear_caches()
+        patcher = mock.patch("pdfmaker.user.eviction.get_pdf_storage")
+        self.storage = patcher.start().return_value
+        self.addCleanup(patcher.stop)
+
+    def store(self, size: int = 100, idle: float | None = None) -> str:
+        pdf_name = pdf_artifact_name(faker.unique.random_int(), faker.sha256())
+        if idle is None:
+            record_pdf_stored(pdf_name, size)
+        else:
+            record_pdf_stored(pdf_name, size, accessed_at=time.time() - idle)
+        return pdf_name
+
+    def deleted(self) -> set:
+        return {call.args[0] for call in self.storage.delete.call_args_list}
+
+    def test_nothing_is_evicted_without_quotas(self):
+        for _ in range(3):
+            self.store(idle=2 * HOUR)
+
+        self.assertEqual(evict_pdfs(), {"evicted_files": 0, "bytes_reclaimed": 0})
+        self.assertEqual(get_pdf_usage(), {"bytes": 300, "files": 3})
+        self.storage.delete.assert_not_called()
+
+    @override_settings(PDF_STORAGE_QUOTA_FILES=4)
+    def test_least_recently_accessed_go_first_down_to_the_target(self):
+        pdf_names = [self.store(idle=(10 - i) * HOUR) for i in range(6)]
+
+        run = evict_pdfs()
+
+        self.assertEqual(run, {"evicted_files": 4, "bytes_reclaimed": 400})
+        self.assertEqual(self.deleted(), set(pdf_names[:4]))
+        self.assertEqual(get_pdf_usage(), {"bytes": 200, "files": 2})
+        self.assertEqual(get_redis_client().zrange(PDF_ACCESS_KEY, 0, -1), pdf_names[4:])
+
+    @override_settings(PDF_STORAGE_QUOTA_BYTES=60)
+    def test_recently_accessed_pdfs_are_kept_over_the_quota(self):
+        old_pdf_names = [self.store(size=50, idle=2 * HOUR) for _ in range(2)]
+        recent_pdf_name = self.store(size=50)
+
+        self.assertEqual(evict_pdfs()["evicted_files"], 2)
+        self.assertEqual(self.deleted(), set(old_pdf_names))
+        self.assertNotIn(recent_pdf_name, self.deleted())
+        self.assertEqual(get_pdf_usage(), {"bytes": 50, "files": 1})
+
+    @override_settings(PDF_STORAGE_QUOTA_FILES=2, PDF_EVICTION_TARGET_RATIO=1, PDF_EVICTION_MIN_AGE=0)
+    def test_an_access_moves_a_pdf_to_the_back(self):
+        first, second, third = (self.store(idle=(3 - i) * HOUR) for i in range(3))
+        touch_pdf(first)
+
+        evict_pdfs()
+
+        self.assertEqual(self.deleted(), {second})
+
+    @override_settings(PDF_ARTIFACT_MAX_IDLE=24 * HOUR)
+    def test_idle_pdfs_are_evicted_with_their_manifest(self):
+        idle_pdf_name = self.store(idle=25 * HOUR)
+        pdf_name = self.store(idle=23 * HOUR)
+        for name in (idle_pdf_name, pdf_name):
+            cache.set(pdf_manifest_key(pdf_artifact_digest(name)), "manifest")
+
+        self.assertEqual(evict_pdfs(), {"evicted_files": 1, "bytes_reclaimed": 100})
+        self.assertEqual(self.deleted(), {idle_pdf_name})
+        self.assertIsNone(cache.get(pdf_manifest_key(pdf_artifact_digest(idle_pdf_name))))
+        self.assertEqual(cache.get(pdf_manifest_key(pdf_artifact_digest(pdf_name))), "manifest")
+
+    @override_settings(PDF_STORAGE_QUOTA_FILES=1, PDF_EVICTION_TARGET_RATIO=1)
+    def test_stats_add_up_the_runs(self):
+        pdf_name = self.store()
+        touch_pdf(pdf_name)
+        touch_pdf(pdf_name)
+        self.store(idle=3 * HOUR)
+        self.store(idle=2 * HOUR)
+
+        evict_pdfs()
+        evict_pdfs()
+
+        self.assertEqual(get_pdf_eviction_stats(), {
+            "usage": {"bytes": 100, "files": 1},
+            "hits": 2,
+            "misses": 1,
+            "hit_rate": 2 / 3,
+            "evicted_files": 2,
+            "bytes_reclaimed": 200,
+        })
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase
+
+from pdfmaker.common.redis_client import get_redis_client
+from pdfmaker.user.models import PdfJob
+from pdfmaker.user.selectors import get_pdf_lease_stats
+from pdfmaker.user.services import enqueue_user_pdf, pdf_lease_key, register, release_pdf_lease
+from pdfmaker.utils.tests import clear_caches, faker
+
+
+class PdfRenderLeaseTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = register(name=faker.name(), bio=None, email=faker.unique.email(), password=faker.password())
+
+    def test_concurrent_requests_attach_to_the_render_in_flight(self):
+        with mock.patch("pdfmaker.user.services.generate_user_pdf.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                task_id = enqueue_user_pdf(self.user)
+                self.assertEqual(enqueue_user_pdf(self.user), task_id)
+                self.assertEqual(enqueue_user_pdf(self.user), task_id)
+
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs["task_id"], task_id)
+        self.assertEqual(PdfJob.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(get_pdf_lease_stats(), {"hits": 2, "misses": 1, "hit_rate": 2 / 3})
+
+    def test_templates_have_their_own_lease(self):
+        with self.captureOnCommitCallbacks():
+            task_id = enqueue_user_pdf(self.user)
+            self.assertNotEqual(enqueue_user_pdf(self.user, template="profile-html"), task_id)
+
+        self.assertEqual(get_pdf_lease_stats()["misses"], 2)
+
+    def test_lease_is_only_released_by_its_task(self):
+        with self.captureOnCommitCallbacks():
+            task_id = enqueue_user_pdf(self.user)
+
+        release_pdf_lease(self.user.id, "another-task")
+        self.assertEqual(get_redis_client().get(pdf_lease_key(self.user.id)), task_id)
+
+        release_pdf_lease(self.user.id, task_id)
+        self.assertIsNone(get_redis_client().get(pdf_lease_key(self.user.id)))
+        with self.captureOnCommitCallbacks():
+            self.assertNotEqual(enqueue_user_pdf(self.user), task_id)
+
+    def test_lease_is_released_when_the_task_cannot_be_sent(self):
+        with mock.patch("pdfmaker.user.services.generate_user_pdf.apply_async", side_effect=ConnectionError):
+            with self.assertRaises(ConnectionError):
+                with self.captureOnCommitCallbacks(execute=True):
+                    task_id = enqueue_user_pdf(self.user)
+
+        self.assertIsNone(get_redis_client().get(pdf_lease_key(self.user.id)))
+        self.assertEqual(PdfJob.objects.get(task_id=task_id).state, PdfJob.State.FAILURE)
+
+    def test_lease_expires_after_the_render_lease_ttl(self):
+        with self.captureOnCommitCallbacks():
+            enqueue_user_pdf(self.user, countdown=10)
+
+        ttl = get_redis_client().pttl(pdf_lease_key(self.user.id))
+        # The countdown is added, the lease must outlive the delayed task
+        self.assertGreater(ttl, (settings.PDF_RENDER_LEASE_TTL + 9) * 1000)
+        self.assertLessEqual(ttl, (settings.PDF_RENDER_LEASE_TTL + 10) * 1000)
@@ -0,0 +1,57 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from pdfmaker.user.counters import increment_profile_counter
+from pdfmaker.user.models import Profile
+from pdfmaker.user.services import register
+from pdfmaker.utils.tests import clear_caches, faker
+
+
+class ProfileApiTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.user = register(name=faker.name(), bio="bio", email=faker.unique.email(), password=faker.password())
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def get(self, etag=None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get("/user/profile/", **headers)
+
+    def test_unchanged_profile_is_served_from_the_cache(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["bio"], "bio")
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().json(), response.json())
+            self.assertEqual(self.get(response["ETag"]).status_code, 304)
+
+    def test_changes_get_a_new_etag(self):
+        etag = self.get()["ETag"]
+
+        increment_profile_counter(self.user.id, "posts_count", 2)
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["posts_count"], 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Profile.objects.get(user=self.user).save()
+        self.assertNotEqual(self.get(response["ETag"]).status_code, 304)
+
+    def test_deactivated_user_is_turned_away(self):
+        etag = self.get()["ETag"]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(etag).status_code, 401)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = True
+            self.user.save()
+        self.assertEqual(self.get(etag).status_code, 200)
@@ -1,7 +1,17 @@
 from django.urls import path
-from .apis import ProfileApi, RegisterApi, AddSignature, LoginView, StartPdfTaskView
-
-
+from .apis import (
+    ProfileApi,
+    RegisterApi,
+    AddSignature,
+    LoginView,
+    StartPdfTaskView,
+    StartBulkPdfTaskView,
+    PdfDownloadApi,
+    PdfJobStatusApi,
+    QueueStatsApi,
+    PdfStatsApi,
+    CacheStatsApi,
+)
 
 urlpatterns = [
     path('register/', RegisterApi.as_view(), name="register"),
@@ -9,4 +19,10 @@ urlpatterns = [
     path('login/', LoginView.as_view(), name="login"),
     path('sign/', AddSignature.as_view(), name="add_signature"),
     path('start_pdf_task/', StartPdfTaskView.as_view(), name='start_pdf_task'),
+    path('pdf/', PdfDownloadApi.as_view(), name='pdf_download'),
+    path('start_bulk_pdf_task/', StartBulkPdfTaskView.as_view(), name='start_bulk_pdf_task'),
+    path('pdf/jobs/status/', PdfJobStatusApi.as_view(), name='pdf_job_status'),
+    path('queues/stats/', QueueStatsApi.as_view(), name='queue_stats'),
+    path('pdf/stats/', PdfStatsApi.as_view(), name='pdf_stats'),
+    path('cache/stats/', CacheStatsApi.as_view(), name='cache_stats'),
 ]
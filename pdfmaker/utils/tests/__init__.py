@@ -1,3 +1,3 @@
 # flake8: noqa
 
-from .base import faker
+from .base import clear_caches, faker
@@ -1,3 +1,20 @@
+import os
+
+from django.core.cache import cache
 from faker import Faker
 
+from pdfmaker.common.redis_client import get_redis_client
+from pdfmaker.common.tiered_cache import tiered_cache
+
 faker = Faker()
+
+
+def clear_caches():
+    """
+    Empties Redis (fakeredis under the test settings), the cache and the
+    in-process tier of the tiered cache, so a test starts from nothing.
+    """
+    get_redis_client().flushall()
+    cache.clear()
+    if tiered_cache._pid == os.getpid():
+        tiered_cache._local.clear()